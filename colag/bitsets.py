@@ -0,0 +1,251 @@
+"""
+Fixed-width bitset representation of the languages in the CoLAG domain.
+
+A `BitsetMatrix` stores one row of bits per grammar (or per sentence), packed
+into uint64 words in a single contiguous array. Bit j of row i is set if the
+i-th row id is related to the j-th column id, so for the language matrix the
+3072 languages take 3072 x 752 words (~18MB) instead of ~3M Python ints in
+sets. Membership is a single word lookup, and intersection, union, subset and
+size computations are word-level numpy operations, which also vectorize over
+many rows at once.
+
+`BitsetMapping` wraps a matrix in the same interface as the dict-of-sets that
+Colag normally uses, so `Colag.use_bitsets` can swap it in transparently.
+
+"""
+
+from collections.abc import Mapping, Set
+
+import numpy as np
+
+WORD_BITS = 64
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(words):
+        """Returns the number of set bits in each element of `words`."""
+        return np.bitwise_count(words)
+else:
+    _BYTE_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(words):
+        """Returns the number of set bits in each element of `words`."""
+        words = np.ascontiguousarray(words)
+        counts = _BYTE_COUNTS[words.view(np.uint8)]
+        return counts.reshape(words.shape + (-1,)).sum(axis=-1, dtype=np.uint8)
+
+def num_words(num_bits):
+    return (num_bits + WORD_BITS - 1) // WORD_BITS
+
+def lookup_table(ids):
+    """Returns an array mapping each id in `ids` to its position, and every
+    other id up to max(ids) to -1."""
+    table = np.full(int(np.max(ids)) + 1, -1, dtype=np.int32)
+    table[ids] = np.arange(len(ids), dtype=np.int32)
+    return table
+
+def pack_csr(offsets, columns, num_rows, num_columns):
+    """Returns a (num_rows x words) uint64 array with bit `columns[k]` set in
+    row r for every k in offsets[r]:offsets[r+1]. Columns must be sorted
+    within each row."""
+    width = num_words(num_columns)
+    words = np.zeros((num_rows, width), dtype=np.uint64)
+    if len(columns) == 0:
+        return words
+    rows = np.repeat(np.arange(num_rows, dtype=np.int64), np.diff(offsets))
+    columns = np.asarray(columns, dtype=np.int64)
+    cells = rows * width + (columns >> 6)
+    bits = np.left_shift(np.uint64(1), (columns & 63).astype(np.uint64))
+    starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    words.reshape(-1)[cells[starts]] = np.bitwise_or.reduceat(bits, starts)
+    return words
+
+def pack_bool(matrix):
+    """Packs a 2d boolean matrix into uint64 words, one row per row."""
+    packed = np.packbits(matrix, axis=1, bitorder='little')
+    width = num_words(matrix.shape[1]) * 8
+    padded = np.zeros((matrix.shape[0], width), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view(np.uint64)
+
+def unpack_bool(words, num_columns):
+    """Inverse of `pack_bool`."""
+    bits = np.unpackbits(np.ascontiguousarray(words).view(np.uint8),
+                         axis=1, bitorder='little')
+    return bits[:, :num_columns].astype(bool)
+
+class BitsetMatrix:
+    """A matrix of bits with one row per id in `row_ids` and one column per
+    id in `column_ids`, stored as uint64 words."""
+    def __init__(self, words, row_ids, column_ids):
+        self.words = words
+        self.row_ids = np.asarray(row_ids)
+        self.column_ids = np.asarray(column_ids)
+        self.rows = lookup_table(self.row_ids)
+        self.columns = lookup_table(self.column_ids)
+
+    @classmethod
+    def from_csr(cls, row_ids, column_ids, offsets, values):
+        """Builds a matrix from CSR adjacency, where `values` holds column
+        ids (not positions)."""
+        columns = lookup_table(column_ids)[np.asarray(values)]
+        return cls(pack_csr(offsets, columns, len(row_ids), len(column_ids)),
+                   row_ids, column_ids)
+
+    @classmethod
+    def from_mapping(cls, mapping, column_ids=None):
+        """Builds a matrix from a mapping of row id -> iterable of column ids,
+        like Colag.language or Colag.sentences."""
+        row_ids = np.array(sorted(mapping), dtype=np.int64)
+        rows = [np.array(sorted(mapping[r]), dtype=np.int64)
+                for r in row_ids.tolist()]
+        if column_ids is None:
+            column_ids = np.unique(np.concatenate(rows))
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in rows], out=offsets[1:])
+        return cls.from_csr(row_ids, column_ids, offsets, np.concatenate(rows))
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def row(self, row_id):
+        """Returns the position of `row_id`, raising KeyError if it has none."""
+        if not isinstance(row_id, (int, np.integer)) \
+                or not 0 <= row_id < len(self.rows) or self.rows[row_id] < 0:
+            raise KeyError(row_id)
+        return self.rows[row_id]
+
+    def positions(self, row_ids):
+        """Returns the positions of an array of row ids."""
+        positions = self.rows[np.asarray(row_ids)]
+        if np.any(positions < 0):
+            raise KeyError(np.asarray(row_ids)[positions < 0].tolist())
+        return positions
+
+    def contains(self, row_id, column_id):
+        """Returns True if bit (row_id, column_id) is set."""
+        if not 0 <= column_id < len(self.columns):
+            return False
+        column = self.columns[column_id]
+        if column < 0:
+            return False
+        word = self.words[self.row(row_id), column >> 6]
+        return bool((int(word) >> int(column & 63)) & 1)
+
+    def contains_many(self, row_ids, column_ids):
+        """Vectorized `contains` over aligned arrays of row and column ids,
+        which must all exist in the matrix."""
+        rows = self.rows[np.asarray(row_ids)]
+        columns = self.columns[np.asarray(column_ids)]
+        words = self.words[rows, columns >> 6]
+        return (words >> (columns & 63).astype(np.uint64)) & np.uint64(1) == 1
+
+    def counts(self, words=None):
+        """Returns the number of set bits in each row of `words` (by default,
+        every row of the matrix)."""
+        if words is None:
+            words = self.words
+        return popcount(words).sum(axis=-1, dtype=np.int64)
+
+    def ids(self, words):
+        """Returns the column ids of the set bits in a single row of words."""
+        bits = np.unpackbits(np.ascontiguousarray(words).view(np.uint8),
+                             bitorder='little')
+        return self.column_ids[np.flatnonzero(bits[:len(self.column_ids)])]
+
+    def intersection_counts(self, a, b):
+        """Returns |A & B| for aligned arrays of row ids `a` and `b`."""
+        return self.counts(self.words[self.positions(a)] & self.words[self.positions(b)])
+
+    def union_counts(self, a, b):
+        """Returns |A | B| for aligned arrays of row ids `a` and `b`."""
+        return self.counts(self.words[self.positions(a)] | self.words[self.positions(b)])
+
+    def issubset(self, a, b):
+        """Returns A <= B for aligned arrays of row ids `a` and `b`."""
+        a = self.words[self.positions(a)]
+        b = self.words[self.positions(b)]
+        return ~np.any(a & ~b, axis=-1)
+
+class Bitset(Set):
+    """A read-only set of column ids backed by one row of uint64 words."""
+    __slots__ = ['matrix', 'words']
+
+    def __init__(self, matrix, words):
+        self.matrix = matrix
+        self.words = words
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+    def _same_columns(self, other):
+        return isinstance(other, Bitset) and \
+            other.matrix.column_ids is self.matrix.column_ids
+
+    def __contains__(self, column_id):
+        if not isinstance(column_id, (int, np.integer)) \
+                or not 0 <= column_id < len(self.matrix.columns):
+            return False
+        column = self.matrix.columns[column_id]
+        if column < 0:
+            return False
+        return bool((int(self.words[column >> 6]) >> int(column & 63)) & 1)
+
+    def __iter__(self):
+        return iter(self.matrix.ids(self.words).tolist())
+
+    def __len__(self):
+        return int(self.matrix.counts(self.words))
+
+    def __and__(self, other):
+        if self._same_columns(other):
+            return Bitset(self.matrix, self.words & other.words)
+        return super().__and__(other)
+
+    def __or__(self, other):
+        if self._same_columns(other):
+            return Bitset(self.matrix, self.words | other.words)
+        return super().__or__(other)
+
+    def __sub__(self, other):
+        if self._same_columns(other):
+            return Bitset(self.matrix, self.words & ~other.words)
+        return super().__sub__(other)
+
+    def __le__(self, other):
+        if self._same_columns(other):
+            return not np.any(self.words & ~other.words)
+        return super().__le__(other)
+
+    def __ge__(self, other):
+        if self._same_columns(other):
+            return other <= self
+        return super().__ge__(other)
+
+    def __eq__(self, other):
+        if self._same_columns(other):
+            return np.array_equal(self.words, other.words)
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Bitset({})'.format(self.matrix.ids(self.words).tolist())
+
+class BitsetMapping(Mapping):
+    """A read-only mapping from row id to the `Bitset` of that row."""
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __getitem__(self, row_id):
+        return Bitset(self.matrix, self.matrix.words[self.matrix.row(row_id)])
+
+    def __contains__(self, row_id):
+        return isinstance(row_id, (int, np.integer)) and \
+            0 <= row_id < len(self.matrix.rows) and self.matrix.rows[row_id] >= 0
+
+    def __iter__(self):
+        return iter(self.matrix.row_ids.tolist())
+
+    def __len__(self):
+        return len(self.matrix.row_ids)
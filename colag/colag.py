@@ -2,6 +2,7 @@ import argparse
 import csv
 import random
 import warnings
+from functools import cached_property
 from itertools import repeat
 from collections import Counter
 
@@ -19,6 +20,7 @@ TRIGGER_VEC_ORDER = '01*~'
 
 COLAG_TSV = './data/COLAG_2011_ids.txt'
 IRRELEVANCE_OUTPUT = './data/irrelevance-output.txt'
+COMPILED_DOMAIN = './data/colag-compiled'
 
 parameters = ['sp',
               'hip',
@@ -37,9 +39,9 @@ parameters = ['sp',
 def grammar_str(g):
     return '{:013b}'.format(g)
 
-def mutate_grammar(rate, g):
+def mutate_grammar(rate, g, rng=random):
     for i in range(13):
-        if random.random() < rate:
+        if rng.random() < rate:
             g = toggled(i, g)
     return g
 
@@ -90,24 +92,51 @@ def irrelevence_array(irrel_list):
                 for count in counter_to_block(counter)]
 
 class Colag:
-    def __init__(self, grammars, sentences, grammar_irr, sentence_irr):
+    def __init__(self, grammars, sentences, grammar_irr, sentence_irr, compiled=None):
         self.sentences = sentences
         self.grammars = grammars
         self.language = grammars
         self.grammar_irr = grammar_irr
         self.sentence_irr = sentence_irr
+        self.compiled = compiled
         self.num_params = 13
+        self._update_tables = {}
 
     @classmethod
     def default(cls):
-        return Colag.from_tsvs(COLAG_TSV, IRRELEVANCE_OUTPUT)
+        return Colag.from_tsvs(COLAG_TSV, IRRELEVANCE_OUTPUT,
+                               compiled_dir=COMPILED_DOMAIN)
 
     @classmethod
-    def from_tsvs(cls, colag_tsv, irrelevance_tsv):
+    def from_compiled(cls, path, irrelevance_tsv):
+        """Opens a domain written by colag.compiled.compile_domain. The
+        grammar and sentence mappings are read-only views of memory-mapped
+        arrays, so this is fast and shares memory between forked processes.
+
+        """
+        from colag.compiled import load_compiled
+        domain = load_compiled(path, irrelevance_tsv)
+        return Colag(domain.languages, domain.generators,
+                     domain.grammar_irr, domain.sentence_irr, compiled=domain)
+
+    @classmethod
+    def from_tsvs(cls, colag_tsv, irrelevance_tsv, compiled_dir=None):
         """Returns a dictionary with sentence ids as keys. Each value is a set of
         grammars IDs - the grammars that generate that sentence.
 
+        If `compiled_dir` is given, the domain is loaded from the compiled copy
+        in that directory, which is (re)built first if it is missing or older
+        than the tsvs.
+
         """
+        if compiled_dir is not None:
+            from colag import compiled
+            if not compiled.is_current(compiled_dir, colag_tsv):
+                compiled.compile_domain(colag_tsv, [irrelevance_tsv], compiled_dir)
+            elif not compiled.is_current(compiled_dir, colag_tsv, irrelevance_tsv):
+                compiled.add_irrelevance(compiled_dir, irrelevance_tsv)
+            return Colag.from_compiled(compiled_dir, irrelevance_tsv)
+
         grammars = {}
         sentences = {}
         sentence_irr = {}
@@ -126,10 +155,8 @@ class Colag:
                 irr_str = sentence_irr[sentence]
                 try:
                     sentences[sentence].add(grammar)
-                    sentence_irr[irr_str].add(grammar)
                 except KeyError:
                     sentences[sentence] = {grammar}
-                    sentence_irr[irr_str] = {grammar}
                 try:
                     grammars[grammar].add(sentence)
                     grammar_irr[grammar].append(irr_str)
@@ -141,47 +168,185 @@ class Colag:
 
         return Colag(grammars, sentences, grammar_irr, sentence_irr)
 
+    @cached_property
+    def language_bits(self):
+        """A colag.bitsets.BitsetMatrix with one row per grammar, one column
+        per sentence."""
+        if self.compiled is not None:
+            return self.compiled.language_bits
+        from colag.bitsets import BitsetMatrix
+        return BitsetMatrix.from_mapping(self.language,
+                                         column_ids=np.array(sorted(self.sentences), dtype=np.int64))
+
+    @cached_property
+    def generator_bits(self):
+        """A colag.bitsets.BitsetMatrix with one row per sentence, one column
+        per grammar."""
+        if self.compiled is not None:
+            return self.compiled.generator_bits
+        from colag.bitsets import BitsetMatrix
+        # Grammars with empty languages generate nothing, but still need a
+        # column so the columns line up with the rows of language_bits.
+        return BitsetMatrix.from_mapping(self.sentences,
+                                         column_ids=self.language_bits.row_ids)
+
+    def use_bitsets(self):
+        """Replaces the dict-of-sets `language`, `grammars` and `sentences`
+        with read-only mappings backed by the bitset matrices, which take an
+        order of magnitude less memory and make membership tests a single
+        word lookup. Returns self.
+
+        """
+        from colag.bitsets import BitsetMapping
+        self.grammars = self.language = BitsetMapping(self.language_bits)
+        self.sentences = BitsetMapping(self.generator_bits)
+        return self
+
+    @cached_property
+    def _parse_table(self):
+        """The bytes of language_bits.words, and as lists: the offset of each
+        grammar id's row in them, and the byte and bit mask of each sentence
+        id's column (-1 for ids not in the domain). The bytes are a view of
+        the (possibly memory-mapped) words, so they are shared between
+        processes rather than copied."""
+        bits = self.language_bits
+        row_bytes = bits.words.shape[1] * 8
+        row_offsets = np.where(bits.rows >= 0, bits.rows * row_bytes, -1)
+        column_bytes = np.where(bits.columns >= 0, bits.columns >> 3, -1)
+        return (memoryview(bits.words).cast('B'), row_offsets.tolist(),
+                column_bytes.tolist(), (1 << (bits.columns & 7)).tolist())
+
+    def parses(self, grammar, sentence):
+        """ Returns True if `sentence` is in the language of `grammar`.
+
+        Learners call this for every sentence they consume, so it reads the
+        bit straight out of the bytes of language_bits with list and
+        memoryview indexing, avoiding numpy's per-call overhead.
+
+        """
+        words, row_offsets, column_bytes, column_masks = self._parse_table
+        try:
+            offset = row_offsets[grammar] if grammar >= 0 else -1
+        except IndexError:
+            offset = -1
+        if offset < 0:
+            raise KeyError(grammar)
+        try:
+            byte = column_bytes[sentence] if sentence >= 0 else -1
+        except IndexError:
+            return False
+        return byte >= 0 and words[offset + byte] & column_masks[sentence] != 0
+
+    @cached_property
+    def relevance_masks(self):
+        """A uint16 array indexed by sentence id: row s holds the relevant and
+        ambiguous parameter masks of sentence s (see colag/masks.py)."""
+        from colag.masks import mask_table, strings_to_chars
+        if self.compiled is not None:
+            return mask_table(self.compiled.sentence_ids, self.compiled.irrelevance)
+        sentence_ids = sorted(self.sentences)
+        return mask_table(sentence_ids,
+                          strings_to_chars([self.sentence_irr[s] for s in sentence_ids]))
+
+    def update_table(self, rates):
+        """A list indexed by sentence id of the (index, multiplier) pairs of
+        the parameters a learner with the given `rates` updates for each
+        sentence (see colag.masks.update_table), computed once per `rates`."""
+        from colag.masks import update_table
+        key = tuple(sorted(rates.items()))
+        if key not in self._update_tables:
+            self._update_tables[key] = update_table(*self.relevance_masks.T, rates)
+        return self._update_tables[key]
+
+    @cached_property
+    def grammar_ids(self):
+        """A frozenset of the id of every grammar in the domain."""
+        return frozenset(self.language)
+
     def legal_grammar(self, g):
-        return g in self.language
-
-    def find_supersets(self, g, cache={}):
-        if g in cache:
-            return cache[g]
-        sgp = self.language[g] #set of sentences g produces
-        sets_of_the_grammars_sgp_is_produced_by = [] #the set of grammers that each sentence in sgp is produced by
-        for i in sgp:
-            sets_of_the_grammars_sgp_is_produced_by.append(self.sentences[i])
-        u = set.intersection(*sets_of_the_grammars_sgp_is_produced_by) #intersection of all the sets produced by the lang
-        u.remove(g)
-        cache[g] = u
-        return u
-
-    def find_equivalent(self, grammar, cache={}):
-        if grammar in cache:
-            return cache[grammar]
-
-        lang = self.language[grammar]
-        u = [g for g in self.language
-                 if lang == self.language[g] and g != grammar]
-
-        cache[grammar] = u
-        return u
+        return g in self.grammar_ids
+
+    @cached_property
+    def lattice(self):
+        """A colag.lattice.SupersetLattice of every language in the domain."""
+        from colag.lattice import SupersetLattice
+        if self.compiled is not None:
+            return SupersetLattice(self.compiled.superset_bits)
+        return SupersetLattice.compute(self.language_bits, self.generator_bits)
+
+    def find_supersets(self, g):
+        """Returns the set of grammars, other than `g`, whose languages contain
+        every sentence in L(g). This includes g's weakly equivalent grammars.
+
+        """
+        return self.lattice.supersets(g)
+
+    def find_subsets(self, g):
+        return self.lattice.subsets(g)
+
+    def find_strict_supersets(self, g):
+        return self.lattice.strict_supersets(g)
+
+    def find_minimal_supersets(self, g):
+        return self.lattice.minimal_supersets(g)
+
+    @cached_property
+    def equivalence_classes(self):
+        """A colag.equivalence.EquivalenceClasses of every grammar in the
+        domain."""
+        from colag.equivalence import EquivalenceClasses
+        if self.compiled is not None:
+            return EquivalenceClasses(self.compiled.grammar_ids,
+                                      self.compiled.equivalence_classes)
+        return EquivalenceClasses.from_bits(self.language_bits)
+
+    def find_equivalent(self, grammar):
+        """Returns the grammars, other than `grammar`, that generate exactly
+        the same sentences as `grammar`."""
+        return self.equivalence_classes.equivalents(grammar)
+
+    def weakly_equivalent(self, g1, g2):
+        return self.equivalence_classes.equivalent(g1, g2)
 
     def grammar_sent_distance(self, g1, g2):
-        return 1 - jaccard_coef(self.grammars[g1], self.grammars[g2])
+        from colag.distances import jaccard_distances
+        return float(jaccard_distances(self.language_bits, [g1], [g2])[0])
 
     def grammar_trig_distance(self, g1, g2):
         return distance.cosine(self.trigger_vector(g1), self.trigger_vector(g2))
 
-    def trigger_vector(self, g1):
-        return irrelevence_array(self.grammar_irr[g1])
-
-def distance_simulation():
+    @cached_property
+    def trigger_matrix(self):
+        """An int array with the trigger vector of every grammar, one row per
+        grammar in the order of language_bits.row_ids, counting each
+        (grammar, sentence, structure) once."""
+        return self.trigger_matrices('structures')
+
+    @cached_property
+    def sentence_trigger_matrix(self):
+        """Like trigger_matrix, but counting each (grammar, sentence) once."""
+        return self.trigger_matrices('sentences')
+
+    def trigger_matrices(self, weighting):
+        from colag import triggers
+        if self.compiled is not None:
+            return triggers.cached_trigger_matrix(self.compiled, weighting)
+        grammars = self.language_bits.row_ids.tolist()
+        if weighting == 'sentences':
+            return triggers.trigger_matrix_from_strings(
+                grammars, {g: [self.sentence_irr[s] for s in self.language[g]] for g in grammars})
+        return triggers.trigger_matrix_from_strings(grammars, self.grammar_irr)
+
+    def trigger_vector(self, g1, per_sentence=False):
+        matrix = self.sentence_trigger_matrix if per_sentence else self.trigger_matrix
+        return matrix[self.language_bits.row(g1)].tolist()
+
+def distance_simulation(rng=random):
     colag = Colag.from_tsvs(COLAG_TSV, IRRELEVANCE_OUTPUT)
     while True:
-        rate = random.random()
-        g1 = random.randint(0, 2**13)
-        g2 = mutate_grammar(rate, g1)
+        rate = rng.random()
+        g1 = rng.randint(0, 2**13)
+        g2 = mutate_grammar(rate, g1, rng)
         if not (g1 in colag.grammars and g2 in colag.grammars):
             continue
         ham = hamming_distance(g1, g2)
@@ -191,24 +356,34 @@ def distance_simulation():
                'sentence_distance': colag.grammar_sent_distance(g1, g2),
                'trigger_distance': colag.grammar_trig_distance(g1, g2)}
 
-def distance_simulation_stdout(n=None):
+def distance_simulation_stdout(n=None, seed=None):
     keys = ['g1', 'g2', 'hamming_distance', 'sentence_distance', 'trigger_distance']
     print(', '.join(keys))
     count = range(n) if n is not None else repeat(None)
-    for _, item in zip(count, distance_simulation()):
+    rng = random
+    if seed is not None:
+        from colag.streams import python_stream
+        rng = python_stream(seed)
+    for _, item in zip(count, distance_simulation(rng)):
         print(', '.join(str(item[key]) for key in keys))
 
-def grammar_trigger_vectors():
-    colag = Colag.from_tsvs(COLAG_TSV, IRRELEVANCE_OUTPUT)
-    for g in colag.grammars:
-        yield [g] + colag.trigger_vector(g)
+def grammar_trigger_vectors(per_sentence=False):
+    colag = Colag.default()
+    matrix = colag.sentence_trigger_matrix if per_sentence else colag.trigger_matrix
+    for g, row in zip(colag.language_bits.row_ids.tolist(), matrix.tolist()):
+        yield [g] + row
 
-def grammar_trigger_vectors_stdout():
+def distance_matrices(output, grammars=None):
+    from colag.distances import write_distance_matrices
+    colag = Colag.default()
+    write_distance_matrices(colag, output, grammars)
+
+def grammar_trigger_vectors_stdout(per_sentence=False):
     header = ['grammar'] + ['P{}={}'.format(n, c)
                                 for irrstr, n in zip(repeat(TRIGGER_VEC_ORDER), range(1, 14))
                                 for c in irrstr]
     print(', '.join(header))
-    for row in grammar_trigger_vectors():
+    for row in grammar_trigger_vectors(per_sentence):
         print(', '.join(str(x) for x in row))
 
 def all_equivalent_grammars():
@@ -216,11 +391,18 @@ def all_equivalent_grammars():
     for grammar in colag.language:
         print('{}, {}'.format(grammar, ', '.join(map(str, colag.find_equivalent(grammar)))))
 
-def all_supersets():
+def all_supersets(kind='all'):
     colag = Colag.default()
+    find = {'all': colag.find_supersets,
+            'strict': colag.find_strict_supersets,
+            'minimal': colag.find_minimal_supersets,
+            'subsets': colag.find_subsets}[kind]
     for grammar in colag.language:
-        print('{}, {}'.format(grammar, ', '.join(map(str, colag.find_supersets(grammar)))))
+        print('{}, {}'.format(grammar, ', '.join(map(str, sorted(find(grammar))))))
 
+def compile_tsvs(colag_tsv, output, irrelevance_tsvs):
+    from colag.compiled import compile_domain
+    compile_domain(colag_tsv, irrelevance_tsvs, output)
 
 def main():
     parser = argparse.ArgumentParser()
@@ -229,10 +411,21 @@ def main():
     distance = subparsers.add_parser('distance',
                                      help=""" Run a simulation that picks random grammars in pairs and computes hamming, jacard, and cosine distance between them. """)
     distance.add_argument('n', type=int, default=None, nargs='?')
+    distance.add_argument('--seed', type=int, default=None,
+                          help='seed the grammar pairs, to make the run reproducible')
     distance.set_defaults(func=distance_simulation_stdout)
 
+    matrices = subparsers.add_parser('distance_matrix',
+                                     help=""" Compute the hamming, jacard, and cosine distance between every pair of grammars and save them as .npy matrices. """)
+    matrices.add_argument('output', help='directory to write the matrices to')
+    matrices.add_argument('--grammars', type=int, nargs='+', default=None,
+                          help='only compute distances between these grammars')
+    matrices.set_defaults(func=distance_matrices)
+
     trigger = subparsers.add_parser('trigger',
                           help=""" Output the trigger vector for every grammar in colag. """)
+    trigger.add_argument('--per-sentence', action='store_true',
+                         help=""" Count each sentence a grammar generates once, rather than once per structure. """)
     trigger.set_defaults(func=grammar_trigger_vectors_stdout)
 
     all_equiv = subparsers.add_parser('all_equiv',
@@ -241,8 +434,17 @@ def main():
 
     all_supers = subparsers.add_parser('all_supers',
                           help=""" For every language in the domain, output all its superset languages """)
+    all_supers.add_argument('--kind', choices=['all', 'strict', 'minimal', 'subsets'], default='all',
+                            help=""" Which relation to output. 'subsets' outputs subset languages instead. """)
     all_supers.set_defaults(func=all_supersets)
 
+    compile_parser = subparsers.add_parser('compile',
+                          help=""" Compile the colag tsv and irrelevance files into a memory-mapped domain directory """)
+    compile_parser.add_argument('--colag-tsv', default=COLAG_TSV)
+    compile_parser.add_argument('--output', default=COMPILED_DOMAIN)
+    compile_parser.add_argument('irrelevance_tsvs', nargs='*', default=[IRRELEVANCE_OUTPUT])
+    compile_parser.set_defaults(func=compile_tsvs)
+
     args = parser.parse_args()
 
     if 'func' not in args:
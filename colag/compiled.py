@@ -0,0 +1,316 @@
+"""
+A compiled, memory-mapped copy of the CoLAG domain.
+
+Reading COLAG_2011_ids.txt with csv.reader and building dictionaries of sets
+takes several seconds and a few hundred MB in every process that needs the
+domain. `compile_domain` parses the tsv once and writes a directory of .npy
+arrays which `load_compiled` opens with mmap, so loading is nearly instant and
+forked worker processes share the same pages.
+
+The directory contains:
+
+- grammar_ids.npy, sentence_ids.npy: the sorted grammar and sentence ids.
+- language_offsets.npy, language_sentences.npy: grammar -> sentence adjacency
+  in CSR form. The sentences of grammar_ids[i] are
+  language_sentences[language_offsets[i]:language_offsets[i+1]], sorted.
+- structure_counts.npy: aligned with language_sentences, the number of rows
+  (structures) the (grammar, sentence) pair has in the tsv.
+- structure_offsets.npy, structure_ids.npy: the structure ids of those rows,
+  in CSR form aligned with language_sentences. The structures of the pair
+  language_sentences[k] are structure_ids[structure_offsets[k]:structure_offsets[k+1]].
+- generator_offsets.npy, generator_grammars.npy: sentence -> grammar adjacency
+  in CSR form.
+- language_bits.npy, generator_bits.npy: the same adjacency as bitset
+  matrices (see colag/bitsets.py), one row per grammar and per sentence.
+- superset_bits.npy: the superset lattice (see colag/lattice.py) as a
+  grammars x grammars bitset matrix.
+- equivalence_classes.npy: the weak equivalence class id of each grammar
+  (see colag/equivalence.py).
+- irrelevance-<name>.npy: one per irrelevance file, a (sentences x 13) matrix
+  of the ascii characters of each sentence's irrelevance string.
+- triggers-<name>-<weighting>.npy: trigger matrices cached by
+  colag/triggers.py, each recorded in the manifest with the stamp of the
+  irrelevance file it was computed from.
+- manifest.json: the format version and the size/mtime of the source files,
+  used to tell when the compiled copy is out of date.
+
+"""
+
+import json
+import os
+from collections.abc import Mapping, Set
+
+import numpy as np
+
+from colag.bitsets import BitsetMatrix, lookup_table, pack_csr
+from colag.equivalence import class_ids_from_bits
+from colag.lattice import superset_words
+
+FORMAT_VERSION = 5
+
+MANIFEST = 'manifest.json'
+
+def source_stamp(path):
+    """Returns a dict identifying the current contents of the file at `path`."""
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime}
+
+def irrelevance_key(irrelevance_tsv):
+    """Returns the name under which an irrelevance file is stored."""
+    return os.path.splitext(os.path.basename(irrelevance_tsv))[0]
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+def write_manifest(path, manifest):
+    tmp = os.path.join(path, MANIFEST + '.tmp')
+    with open(tmp, 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(path, MANIFEST))
+
+def save_array(path, name, array):
+    """Writes `array` to name.npy in `path` through a temporary file, so
+    processes that have the old file memory-mapped keep reading its (now
+    unlinked) pages instead of seeing it truncated under them."""
+    tmp = os.path.join(path, name + '.tmp.npy')
+    np.save(tmp, array)
+    os.replace(tmp, os.path.join(path, name + '.npy'))
+
+def is_current(path, colag_tsv, irrelevance_tsv=None):
+    """Returns True if the compiled domain at `path` was built from the current
+    contents of `colag_tsv` (and `irrelevance_tsv`, if given)."""
+    manifest = read_manifest(path)
+    if manifest is None or manifest.get('version') != FORMAT_VERSION:
+        return False
+    if manifest['domain'] != source_stamp(colag_tsv):
+        return False
+    if irrelevance_tsv is not None:
+        stamp = manifest['irrelevance'].get(irrelevance_key(irrelevance_tsv))
+        if stamp != source_stamp(irrelevance_tsv):
+            return False
+    return True
+
+def read_colag_tsv(colag_tsv):
+    """Returns an (n x 3) int array of the grammar, sentence and structure ids
+    in the colag tsv."""
+    return np.fromfile(colag_tsv, dtype=np.int64, sep=' ').reshape(-1, 3)
+
+def read_irrelevance_tsv(irrelevance_tsv, sentence_ids):
+    """Returns a (len(sentence_ids) x 13) uint8 matrix of irrelevance string
+    characters, one row per sentence id."""
+    strings = {}
+    with open(irrelevance_tsv) as handle:
+        for line in handle:
+            sid, irr = line.split()
+            strings[int(sid)] = irr
+    return np.array([list(strings[sid].encode('ascii'))
+                     for sid in sentence_ids.tolist()],
+                    dtype=np.uint8).reshape(len(sentence_ids), -1)
+
+def csr_offsets(keys, num_keys):
+    """Returns CSR offsets for values grouped by the sorted row numbers
+    `keys`."""
+    offsets = np.zeros(num_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=num_keys), out=offsets[1:])
+    return offsets
+
+def compile_domain(colag_tsv, irrelevance_tsvs, path):
+    """Parses `colag_tsv` and each file in `irrelevance_tsvs` and writes the
+    compiled domain to the directory `path`."""
+    os.makedirs(path, exist_ok=True)
+    rows = read_colag_tsv(colag_tsv)
+    grammar_ids, grammar_rows = np.unique(rows[:, 0], return_inverse=True)
+    sentence_ids, sentence_cols = np.unique(rows[:, 1], return_inverse=True)
+    by_structure = np.lexsort((rows[:, 2], sentence_cols, grammar_rows))
+
+    pairs, counts = np.unique(grammar_rows * len(sentence_ids) + sentence_cols,
+                              return_counts=True)
+    pair_grammars = pairs // len(sentence_ids)
+    pair_sentences = pairs % len(sentence_ids)
+
+    by_sentence = np.lexsort((pair_grammars, pair_sentences))
+    language_offsets = csr_offsets(pair_grammars, len(grammar_ids))
+    generator_offsets = csr_offsets(pair_sentences[by_sentence], len(sentence_ids))
+
+    arrays = {
+        'grammar_ids': grammar_ids.astype(np.int16),
+        'sentence_ids': sentence_ids.astype(np.int32),
+        'language_offsets': language_offsets,
+        'language_sentences': sentence_ids[pair_sentences].astype(np.int32),
+        'structure_counts': counts.astype(np.uint16),
+        'structure_offsets': np.concatenate([[0], np.cumsum(counts)]),
+        'structure_ids': rows[by_structure, 2].astype(np.int32),
+        'generator_offsets': generator_offsets,
+        'generator_grammars': grammar_ids[pair_grammars[by_sentence]].astype(np.int16),
+        'language_bits': pack_csr(language_offsets, pair_sentences,
+                                  len(grammar_ids), len(sentence_ids)),
+        'generator_bits': pack_csr(generator_offsets, pair_grammars[by_sentence],
+                                   len(sentence_ids), len(grammar_ids)),
+    }
+    language_bits = BitsetMatrix(arrays['language_bits'], grammar_ids, sentence_ids)
+    arrays['superset_bits'] = superset_words(
+        language_bits, BitsetMatrix(arrays['generator_bits'], sentence_ids, grammar_ids))
+    arrays['equivalence_classes'] = class_ids_from_bits(language_bits)
+    for name, array in arrays.items():
+        save_array(path, name, array)
+
+    manifest = {'version': FORMAT_VERSION,
+                'domain': source_stamp(colag_tsv),
+                'irrelevance': {}}
+    write_manifest(path, manifest)
+    for irrelevance_tsv in irrelevance_tsvs:
+        add_irrelevance(path, irrelevance_tsv)
+
+def add_irrelevance(path, irrelevance_tsv):
+    """Compiles `irrelevance_tsv` into the existing compiled domain at `path`."""
+    manifest = read_manifest(path)
+    key = irrelevance_key(irrelevance_tsv)
+    sentence_ids = np.load(os.path.join(path, 'sentence_ids.npy'))
+    matrix = read_irrelevance_tsv(irrelevance_tsv, sentence_ids)
+    save_array(path, 'irrelevance-{}'.format(key), matrix)
+    manifest['irrelevance'][key] = source_stamp(irrelevance_tsv)
+    write_manifest(path, manifest)
+
+class CSRRow(Set):
+    """A read-only set of ints backed by a sorted slice of a CSR index array."""
+    __slots__ = ['values']
+
+    def __init__(self, values):
+        self.values = values
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+    def __contains__(self, item):
+        i = np.searchsorted(self.values, item)
+        return i < len(self.values) and self.values[i] == item
+
+    def __iter__(self):
+        return iter(self.values.tolist())
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return 'CSRRow({})'.format(self.values.tolist())
+
+class CSRMapping(Mapping):
+    """A read-only mapping from ids to `CSRRow` sets."""
+    def __init__(self, ids, rows, offsets, values):
+        self.ids = ids
+        self.rows = rows
+        self.offsets = offsets
+        self.values = values
+
+    def row(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self.rows[key]
+
+    def __getitem__(self, key):
+        row = self.row(key)
+        return CSRRow(self.values[self.offsets[row]:self.offsets[row + 1]])
+
+    def __contains__(self, key):
+        return isinstance(key, (int, np.integer)) and \
+            0 <= key < len(self.rows) and self.rows[key] >= 0
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __len__(self):
+        return len(self.ids)
+
+class IrrelevanceStrings(Mapping):
+    """A read-only mapping from sentence id to irrelevance string."""
+    def __init__(self, domain):
+        self.domain = domain
+
+    def __getitem__(self, sentence):
+        row = self.domain.generators.row(sentence)
+        return self.domain.irrelevance[row].tobytes().decode('ascii')
+
+    def __iter__(self):
+        return iter(self.domain.sentence_ids.tolist())
+
+    def __len__(self):
+        return len(self.domain.sentence_ids)
+
+class GrammarIrrelevance(Mapping):
+    """A read-only mapping from grammar id to the list of irrelevance strings
+    of the sentences it generates, one per row in the colag tsv."""
+    def __init__(self, domain):
+        self.domain = domain
+
+    def __getitem__(self, grammar):
+        row = self.domain.languages.row(grammar)
+        start, end = self.domain.language_offsets[row:row + 2]
+        return [self.domain.sentence_irr[sentence]
+                for sentence, count in zip(self.domain.language_sentences[start:end].tolist(),
+                                           self.domain.structure_counts[start:end].tolist())
+                for _ in range(count)]
+
+    def __iter__(self):
+        return iter(self.domain.grammar_ids.tolist())
+
+    def __len__(self):
+        return len(self.domain.grammar_ids)
+
+class CompiledDomain:
+    """The arrays of a compiled domain, memory-mapped read-only."""
+    def __init__(self, path, irrelevance_tsv):
+        self.path = path
+        self.manifest = read_manifest(path)
+        if self.manifest is None or self.manifest.get('version') != FORMAT_VERSION:
+            raise ValueError('{} is not a compiled colag domain'.format(path))
+        for name in ['grammar_ids', 'sentence_ids',
+                     'language_offsets', 'language_sentences', 'structure_counts',
+                     'structure_offsets', 'structure_ids',
+                     'generator_offsets', 'generator_grammars']:
+            setattr(self, name, self.load(name))
+        self.irrelevance_key = irrelevance_key(irrelevance_tsv)
+        self.irrelevance = self.load('irrelevance-{}'.format(self.irrelevance_key))
+        self.grammar_rows = lookup_table(self.grammar_ids)
+        self.sentence_rows = lookup_table(self.sentence_ids)
+
+        self.languages = CSRMapping(self.grammar_ids, self.grammar_rows,
+                                    self.language_offsets, self.language_sentences)
+        self.generators = CSRMapping(self.sentence_ids, self.sentence_rows,
+                                     self.generator_offsets, self.generator_grammars)
+        self.sentence_irr = IrrelevanceStrings(self)
+        self.grammar_irr = GrammarIrrelevance(self)
+
+        self.language_bits = BitsetMatrix(self.load('language_bits'),
+                                          self.grammar_ids, self.sentence_ids)
+        self.generator_bits = BitsetMatrix(self.load('generator_bits'),
+                                           self.sentence_ids, self.grammar_ids)
+        self.superset_bits = BitsetMatrix(self.load('superset_bits'),
+                                          self.grammar_ids, self.grammar_ids)
+        self.equivalence_classes = self.load('equivalence_classes')
+
+    def load(self, name):
+        return np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+
+    def structures(self, grammar, sentence):
+        """Returns the ids of the structures `grammar` assigns `sentence`
+        (empty if it doesn't generate it)."""
+        row = self.languages.row(grammar)
+        start, end = self.language_offsets[row:row + 2]
+        sentences = self.language_sentences[start:end]
+        k = np.searchsorted(sentences, sentence)
+        if k == len(sentences) or sentences[k] != sentence:
+            return []
+        k += start
+        return self.structure_ids[self.structure_offsets[k]:self.structure_offsets[k + 1]].tolist()
+
+def load_compiled(path, irrelevance_tsv):
+    """Opens the compiled domain at `path`, with the irrelevance strings from
+    `irrelevance_tsv`."""
+    return CompiledDomain(path, irrelevance_tsv)
@@ -0,0 +1,138 @@
+"""
+Vectorized distance measures between grammars.
+
+These compute the same three measures as `distance_simulation` in colag.py,
+but for whole arrays of grammar pairs at once, or for every pair:
+
+- hamming: the number of parameters on which two grammars differ, the
+  popcount of the XOR of their ids.
+- sentence: the Jaccard distance between two languages, from the size of
+  their intersection (bitset AND, or a sparse matrix product for all pairs).
+- trigger: the cosine distance between two grammars' trigger vectors (see
+  colag/triggers.py).
+
+`write_distance_matrices` writes the full matrices as .npy files that can be
+opened with np.load(..., mmap_mode='r').
+
+"""
+
+import os
+
+import numpy as np
+
+from colag.bitsets import popcount
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+MEASURES = ['hamming', 'sentence', 'trigger']
+
+def hamming_distances(g1, g2):
+    """Returns the hamming distances between aligned arrays of grammar ids."""
+    return popcount(np.bitwise_xor(np.asarray(g1, dtype=np.uint16),
+                                   np.asarray(g2, dtype=np.uint16)))
+
+def hamming_matrix(grammars, others=None):
+    """Returns the hamming distance from every grammar in `grammars` to every
+    grammar in `others` (by default, `grammars`)."""
+    grammars = np.asarray(grammars, dtype=np.uint16)
+    others = grammars if others is None else np.asarray(others, dtype=np.uint16)
+    return popcount(grammars[:, None] ^ others[None, :])
+
+def jaccard_distances(language_bits, g1, g2):
+    """Returns the Jaccard distance between the languages of aligned arrays
+    of grammar ids."""
+    intersection = language_bits.intersection_counts(g1, g2)
+    union = language_bits.union_counts(g1, g2)
+    return 1 - intersection / union
+
+def intersection_matrix(language_bits, grammars):
+    """Returns |L(g1) & L(g2)| for every pair of grammars in `grammars`."""
+    positions = language_bits.positions(grammars)
+    words = language_bits.words[positions]
+    if sparse is not None:
+        rows, columns = [], []
+        for start in range(0, len(positions), 256):
+            bits = np.unpackbits(np.ascontiguousarray(words[start:start + 256]).view(np.uint8),
+                                 axis=1, bitorder='little')
+            block_rows, block_columns = np.nonzero(bits)
+            rows.append(block_rows + start)
+            columns.append(block_columns)
+        rows = np.concatenate(rows)
+        incidence = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32),
+                                       (rows, np.concatenate(columns))),
+                                      shape=(len(positions), words.shape[1] * 64))
+        return (incidence @ incidence.T).toarray()
+    counts = np.empty((len(positions), len(positions)), dtype=np.int64)
+    for row in range(len(positions)):
+        counts[row] = popcount(words & words[row]).sum(axis=1)
+    return counts
+
+def jaccard_matrix(language_bits, grammars):
+    """Returns the Jaccard distance between the languages of every pair of
+    grammars in `grammars`."""
+    intersection = intersection_matrix(language_bits, grammars)
+    sizes = np.diag(intersection)
+    union = sizes[:, None] + sizes[None, :] - intersection
+    return 1 - intersection / union
+
+def normalized_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float64)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def cosine_distances(trigger_matrix, rows1, rows2):
+    """Returns the cosine distances between aligned arrays of rows of
+    `trigger_matrix`."""
+    normed = normalized_rows(trigger_matrix)
+    return 1 - np.einsum('ij,ij->i', normed[rows1], normed[rows2])
+
+def cosine_matrix(trigger_matrix, rows):
+    """Returns the cosine distance between every pair of `rows` of
+    `trigger_matrix`."""
+    normed = normalized_rows(trigger_matrix)[rows]
+    return 1 - normed @ normed.T
+
+def pair_distances(colag, g1, g2):
+    """Returns a dict with the hamming, sentence and trigger distances between
+    aligned arrays of grammar ids."""
+    rows1 = colag.language_bits.positions(g1)
+    rows2 = colag.language_bits.positions(g2)
+    return {'hamming': hamming_distances(g1, g2),
+            'sentence': jaccard_distances(colag.language_bits, g1, g2),
+            'trigger': cosine_distances(colag.trigger_matrix, rows1, rows2)}
+
+def distance_matrices(colag, grammars=None):
+    """Returns a dict with the hamming, sentence and trigger distance matrices
+    between every pair of `grammars` (by default, every grammar in the
+    domain)."""
+    if grammars is None:
+        grammars = colag.language_bits.row_ids
+    rows = colag.language_bits.positions(grammars)
+    return {'hamming': hamming_matrix(grammars),
+            'sentence': jaccard_matrix(colag.language_bits, grammars),
+            'trigger': cosine_matrix(colag.trigger_matrix, rows)}
+
+def write_distance_matrices(colag, path, grammars=None, dtype=np.float32):
+    """Writes grammar_ids.npy and one (n x n) .npy matrix per measure to the
+    directory `path`."""
+    os.makedirs(path, exist_ok=True)
+    if grammars is None:
+        grammars = colag.language_bits.row_ids
+    grammars = np.asarray(grammars)
+    np.save(os.path.join(path, 'grammar_ids.npy'), grammars)
+    for measure, matrix in distance_matrices(colag, grammars).items():
+        kind = np.uint8 if measure == 'hamming' else dtype
+        out = np.lib.format.open_memmap(os.path.join(path, measure + '.npy'),
+                                        mode='w+', dtype=kind, shape=matrix.shape)
+        out[:] = matrix
+        out.flush()
+        del out
+
+def load_distance_matrices(path):
+    """Returns (grammar_ids, {measure: matrix}) for matrices written by
+    `write_distance_matrices`, memory-mapped read-only."""
+    grammars = np.load(os.path.join(path, 'grammar_ids.npy'))
+    return grammars, {measure: np.load(os.path.join(path, measure + '.npy'), mmap_mode='r')
+                      for measure in MEASURES}
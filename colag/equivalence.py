@@ -0,0 +1,73 @@
+"""
+Weak equivalence classes of the grammars in the CoLAG domain.
+
+Two grammars are weakly equivalent if they generate exactly the same set of
+sentences. Instead of comparing every language against every other, each
+language's bitset row (see colag/bitsets.py) is hashed once, and grammars
+with the same digest share a class. Digest matches are confirmed by comparing
+the rows, so a hash collision can't merge two different languages.
+
+"""
+
+import hashlib
+
+import numpy as np
+
+from colag.bitsets import lookup_table
+
+def language_digest(words):
+    return hashlib.blake2b(np.ascontiguousarray(words).tobytes(),
+                           digest_size=16).digest()
+
+def class_ids_from_bits(language_bits):
+    """Returns an int32 array with the equivalence class id of each row of
+    `language_bits`. Class ids are numbered in order of each class's first
+    (lowest) grammar id."""
+    class_ids = np.empty(len(language_bits.row_ids), dtype=np.int32)
+    representatives = {}
+    for row in range(len(language_bits.row_ids)):
+        words = language_bits.words[row]
+        key = language_digest(words)
+        while key in representatives and \
+                not np.array_equal(language_bits.words[representatives[key][0]], words):
+            key += b'\0'
+        if key not in representatives:
+            representatives[key] = (row, len(representatives))
+        class_ids[row] = representatives[key][1]
+    return class_ids
+
+class EquivalenceClasses:
+    """A grammar -> class id index and a class id -> members lookup."""
+    def __init__(self, grammar_ids, class_ids):
+        self.grammar_ids = np.asarray(grammar_ids)
+        self.class_ids = np.asarray(class_ids)
+        self.rows = lookup_table(self.grammar_ids)
+        order = np.argsort(self.class_ids, kind='stable')
+        bounds = np.flatnonzero(np.diff(self.class_ids[order])) + 1
+        self.members = [tuple(self.grammar_ids[group].tolist())
+                        for group in np.split(order, bounds)]
+
+    @classmethod
+    def from_bits(cls, language_bits):
+        return cls(language_bits.row_ids, class_ids_from_bits(language_bits))
+
+    def __len__(self):
+        return len(self.members)
+
+    def class_of(self, grammar):
+        """Returns the class id of `grammar`."""
+        if not 0 <= grammar < len(self.rows) or self.rows[grammar] < 0:
+            raise KeyError(grammar)
+        return int(self.class_ids[self.rows[grammar]])
+
+    def classes_of(self, grammars):
+        """Returns the class ids of an array of grammars."""
+        return self.class_ids[self.rows[np.asarray(grammars)]]
+
+    def equivalent(self, g1, g2):
+        """Returns True if g1 and g2 generate the same language."""
+        return self.class_of(g1) == self.class_of(g2)
+
+    def equivalents(self, grammar):
+        """Returns the grammars, other than `grammar`, in `grammar`'s class."""
+        return [g for g in self.members[self.class_of(grammar)] if g != grammar]
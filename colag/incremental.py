@@ -0,0 +1,201 @@
+"""
+Incremental updates of an irrelevance file when grammars are added to or
+removed from the domain.
+
+Only two things feed into a sentence's irrelevance string: the set of
+grammars that generate it, and for each of those, whether its minimal pairs
+are legal (and, for the no-equiv/no-superset variants, how their languages
+compare). So when a set of grammars changes, the only strings that can change
+are those of sentences generated by a changed grammar, or by a one-parameter
+neighbour of one. `update_irrelevance` finds those sentences, recomputes just
+their strings with the batch engine in colag/relevance.py and overwrites them
+in the irrelevance file in place (every string is 13 characters, so each line
+keeps its length). If the file is also stored in the compiled domain, that
+copy is updated too.
+
+The diff is relative to the domain `colag` was loaded from, and the file
+being updated must hold the strings for that domain.
+
+"""
+
+import argparse
+import os
+import warnings
+
+import numpy as np
+
+from colag import compiled
+from colag.bitsets import pack_bool, unpack_bool
+from colag.colag import Colag, COLAG_TSV, COMPILED_DOMAIN, IRRELEVANCE_OUTPUT
+from colag.relevance import (NUM_GRAMMARS, NUM_PARAMS, VARIANTS, grammar_words,
+                             ignored_pair_words, incidence_words, param_bit,
+                             relevance_block)
+
+def neighbours(grammars):
+    """Returns the grammar ids that differ from one of `grammars` in exactly
+    one parameter."""
+    grammars = np.asarray(grammars, dtype=np.int64)
+    return np.unique(np.concatenate([grammars ^ (1 << bit) for bit in range(NUM_PARAMS)]))
+
+def language_words(colag, sentences):
+    """Returns the bitset over colag's sentence columns of `sentences`."""
+    columns = colag.language_bits.columns
+    sentences = np.asarray(sorted(sentences), dtype=np.int64)
+    if len(sentences) and (sentences.max() >= len(columns) or np.any(columns[sentences] < 0)):
+        raise ValueError('added grammars can only generate sentences already in the domain')
+    mask = np.zeros((1, len(colag.language_bits.column_ids)), dtype=bool)
+    mask[0, columns[sentences]] = True
+    return pack_bool(mask)[0]
+
+class DomainDiff:
+    """The state the relevance engine needs for the domain after removing the
+    grammars `removed` and adding `added`, a dict of grammar id -> iterable of
+    the sentence ids it generates."""
+    def __init__(self, colag, removed=(), added=None):
+        added = added or {}
+        self.colag = colag
+        self.removed = np.array(sorted(removed), dtype=np.int64)
+        self.added = np.array(sorted(added), dtype=np.int64)
+        domain = colag.language_bits.row_ids
+        if not np.all(np.isin(self.removed, domain)):
+            raise ValueError('can only remove grammars that are in the domain')
+        if np.any(np.isin(self.added, domain)):
+            raise ValueError('can only add grammars that are not in the domain')
+
+        self.old_legal = grammar_words(domain)
+        self.new_grammars = np.union1d(np.setdiff1d(domain, self.removed), self.added)
+        self.legal = grammar_words(self.new_grammars)
+        self.added_languages = {g: language_words(colag, added[g]) for g in self.added.tolist()}
+
+        self.old_incidence = incidence_words(colag)
+        self.incidence = self.old_incidence & ~grammar_words(self.removed)
+        for grammar, words in self.added_languages.items():
+            sentences = np.flatnonzero(unpack_bool(words[None], len(self.incidence))[0])
+            self.incidence[sentences, grammar >> 6] |= np.uint64(1 << (grammar & 63))
+
+    def language(self, grammar):
+        if grammar in self.added_languages:
+            return self.added_languages[grammar]
+        return self.colag.language_bits.words[self.colag.language_bits.row(grammar)]
+
+    def ignored_pair_words(self, variant):
+        """Returns `relevance.ignored_pair_words` for the new domain. Only the
+        pairs involving an added grammar need to be compared."""
+        ignored = ignored_pair_words(self.colag, variant)
+        if ignored is None:
+            return None
+        ignored &= ~grammar_words(self.removed)
+        for param in range(NUM_PARAMS):
+            bit = param_bit(param)
+            for a in self.added.tolist():
+                h = a ^ (1 << bit)
+                if not self.legal_grammar(h):
+                    continue
+                for g, pair in [(a, h), (h, a)]:
+                    if self.related(variant, g, pair):
+                        ignored[param, g >> 6] |= np.uint64(1 << (g & 63))
+                    else:
+                        ignored[param, g >> 6] &= ~np.uint64(1 << (g & 63))
+        return ignored
+
+    def legal_grammar(self, g):
+        return bool((int(self.legal[g >> 6]) >> (g & 63)) & 1)
+
+    def related(self, variant, g, minimal_pair):
+        lg, lpair = self.language(g), self.language(minimal_pair)
+        if variant == 'equiv':
+            return np.array_equal(lg, lpair)
+        return not np.any(lg & ~lpair)
+
+    def affected_rows(self):
+        """Returns the positions of the sentences whose strings may change."""
+        changed = np.union1d(self.removed, self.added)
+        if len(changed) == 0:
+            return np.zeros(0, dtype=np.int64)
+        mask = grammar_words(np.union1d(changed, neighbours(changed)))
+        touched = (self.old_incidence | self.incidence) & mask
+        return np.flatnonzero(np.any(touched, axis=1))
+
+def line_offsets(path):
+    """Returns a dict of sentence id -> byte offset of its irrelevance string
+    in the irrelevance file at `path`."""
+    offsets = {}
+    position = 0
+    with open(path, 'rb') as handle:
+        for line in handle:
+            sid, _ = line.split()
+            offsets[int(sid)] = position + len(sid) + 1
+            position += len(line)
+    return offsets
+
+def update_irrelevance(colag, irrelevance_tsv, removed=(), added=None, variant='normal'):
+    """Recomputes the strings affected by removing the grammars `removed` and
+    adding `added` (see DomainDiff), and overwrites them in
+    `irrelevance_tsv`. Returns the ids of the sentences that were
+    recomputed."""
+    diff = DomainDiff(colag, removed, added)
+    rows = diff.affected_rows()
+    incidence = diff.incidence[rows]
+    empty = ~np.any(incidence, axis=1)
+    if np.any(empty):
+        warnings.warn('{} sentences have no generators left; their strings are unchanged'
+                      .format(int(empty.sum())))
+        rows, incidence = rows[~empty], incidence[~empty]
+
+    chars = relevance_block(incidence, diff.legal, diff.ignored_pair_words(variant))
+    sentence_ids = colag.generator_bits.row_ids[rows]
+
+    offsets = line_offsets(irrelevance_tsv)
+    with open(irrelevance_tsv, 'r+b') as handle:
+        for sid, row in zip(sentence_ids.tolist(), chars):
+            handle.seek(offsets[sid])
+            handle.write(row.tobytes())
+
+    if colag.compiled is not None:
+        update_compiled(colag.compiled.path, irrelevance_tsv, rows, chars)
+    return sentence_ids
+
+def update_compiled(path, irrelevance_tsv, rows, chars):
+    """Writes updated rows of an irrelevance matrix into the compiled domain
+    at `path`, if it has a copy of `irrelevance_tsv`."""
+    manifest = compiled.read_manifest(path)
+    key = compiled.irrelevance_key(irrelevance_tsv)
+    if manifest is None or key not in manifest['irrelevance']:
+        return
+    matrix = np.load(os.path.join(path, 'irrelevance-{}.npy'.format(key)), mmap_mode='r+')
+    matrix[rows] = chars
+    matrix.flush()
+    del matrix
+    manifest['irrelevance'][key] = compiled.source_stamp(irrelevance_tsv)
+    compiled.write_manifest(path, manifest)
+
+def read_grammar_ids(path):
+    with open(path) as handle:
+        return {int(line) for line in handle if line.strip()}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=""" Update an irrelevance file in place after removing grammars from the domain or changing the disallowed grammar list. """)
+    parser.add_argument('irrelevance_tsv', nargs='?', default=IRRELEVANCE_OUTPUT)
+    parser.add_argument('--variant', choices=VARIANTS, default='normal')
+    parser.add_argument('--drop', type=int, nargs='+', default=[],
+                        help='grammar ids to remove from the domain')
+    parser.add_argument('--ng-file', default=None,
+                        help="""a new disallowed grammar list. Domain grammars it lists are removed; grammars
+                        it doesn't list become legal (generating no sentences).""")
+    args = parser.parse_args()
+
+    colag = Colag.from_tsvs(COLAG_TSV, args.irrelevance_tsv, compiled_dir=COMPILED_DOMAIN)
+    domain = set(colag.language)
+    removed = set(args.drop)
+    added = {}
+    if args.ng_file is not None:
+        disallowed = read_grammar_ids(args.ng_file)
+        removed |= domain & disallowed
+        added = {g: () for g in range(NUM_GRAMMARS)
+                 if g not in domain and g not in disallowed}
+    sentences = update_irrelevance(colag, args.irrelevance_tsv, removed, added, args.variant)
+    print('recomputed {} sentences'.format(len(sentences)))
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-from colag import Colag
+from colag.colag import Colag
 
 NUM_PARAMS = 13
 
@@ -71,11 +71,12 @@ def mark_irrelevant_params_ignore_weakly_equiv(colag, sentence):
         generators = colag.sentences[sentence]
         for generator in generators:
             minimal_pair = toggled(param, generator)
+            # a minimal pair that is weakly equivalent to `generator` doesn't
+            # count as one of the sentence's generators.
             # TODO: is this "and" correct?
-            supersets = colag.find_equivalent(generator)
-            gens = [g for g in generators
-                        if g not in supersets]
-            if minimal_pair not in gens and colag.legal_grammar(minimal_pair):
+            if (minimal_pair not in generators
+                    or colag.weakly_equivalent(generator, minimal_pair)) \
+                    and colag.legal_grammar(minimal_pair):
                 relstr[param] = '*'
                 break
     return relstr
@@ -91,11 +92,12 @@ def mark_irrelevant_params_ignore_supersets(colag, sentence):
         generators = colag.sentences[sentence]
         for generator in generators:
             minimal_pair = toggled(param, generator)
+            # a minimal pair that generates a superset of `generator`'s
+            # language doesn't count as one of the sentence's generators.
             # TODO: is this "and" correct?
-            supersets = colag.find_supersets(generator)
-            gens = [g for g in generators
-                        if g not in supersets]
-            if minimal_pair not in gens and colag.legal_grammar(minimal_pair):
+            if (minimal_pair not in generators
+                    or colag.lattice.is_subset(generator, minimal_pair)) \
+                    and colag.legal_grammar(minimal_pair):
                 relstr[param] = '*'
                 break
     return relstr
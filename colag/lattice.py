@@ -0,0 +1,104 @@
+"""
+The subset/superset lattice of the languages in the CoLAG domain.
+
+L(g) is a subset of L(h) exactly when h generates every sentence in L(g), so
+row g of the superset matrix is the AND of the generator bitsets (see
+colag/bitsets.py) of every sentence in L(g). That is a few hundred word
+operations per sentence instead of a Python set intersection per grammar, so
+the whole lattice takes about a second to compute. The compiled domain stores
+it in superset_bits.npy.
+
+"""
+
+import numpy as np
+
+from colag.bitsets import BitsetMatrix, pack_bool, unpack_bool
+
+def superset_words(language_bits, generator_bits):
+    """Returns a (grammars x grammars) packed bit matrix whose bit (g, h) is
+    set if L(g) is a subset of L(h)."""
+    if not np.array_equal(language_bits.column_ids, generator_bits.row_ids):
+        raise ValueError('language and generator matrices have different sentences')
+    if not np.array_equal(generator_bits.column_ids, language_bits.row_ids):
+        raise ValueError('language and generator matrices have different grammars')
+    num_grammars = len(language_bits.row_ids)
+    words = np.empty((num_grammars, generator_bits.words.shape[1]), dtype=np.uint64)
+    valid = pack_bool(np.ones((1, num_grammars), dtype=bool))[0]
+    for row in range(num_grammars):
+        sentences = np.flatnonzero(
+            unpack_bool(language_bits.words[row:row + 1], len(language_bits.column_ids))[0])
+        words[row] = np.bitwise_and.reduce(generator_bits.words[sentences], axis=0) & valid
+    return words
+
+class SupersetLattice:
+    """Superset, subset and weak equivalence relations between every pair of
+    languages in the domain.
+
+    `supersets` is a BitsetMatrix with one row and one column per grammar;
+    bit (g, h) is set if L(g) is a subset of L(h). Note that every language
+    is a subset of itself.
+
+    """
+    def __init__(self, supersets):
+        self.supersets_bits = supersets
+        grammar_ids = supersets.row_ids
+        subsets = pack_bool(unpack_bool(supersets.words, len(grammar_ids)).T)
+        self.subsets_bits = BitsetMatrix(subsets, grammar_ids, grammar_ids)
+
+    @classmethod
+    def compute(cls, language_bits, generator_bits):
+        grammar_ids = language_bits.row_ids
+        return cls(BitsetMatrix(superset_words(language_bits, generator_bits),
+                                grammar_ids, grammar_ids))
+
+    def _row(self, matrix, grammar):
+        return matrix.words[matrix.row(grammar)]
+
+    def _self_bit(self, grammar):
+        words = np.zeros(self.supersets_bits.words.shape[1], dtype=np.uint64)
+        column = self.supersets_bits.columns[grammar]
+        words[column >> 6] = np.uint64(1) << np.uint64(column & 63)
+        return words
+
+    def _ids(self, words):
+        return set(self.supersets_bits.ids(words).tolist())
+
+    def supersets(self, grammar):
+        """Returns the set of grammars, other than `grammar`, whose language
+        contains L(grammar)."""
+        return self._ids(self._row(self.supersets_bits, grammar) & ~self._self_bit(grammar))
+
+    def subsets(self, grammar):
+        """Returns the set of grammars, other than `grammar`, whose language
+        is contained in L(grammar)."""
+        return self._ids(self._row(self.subsets_bits, grammar) & ~self._self_bit(grammar))
+
+    def equivalents(self, grammar):
+        """Returns the set of grammars, other than `grammar`, that generate
+        exactly L(grammar)."""
+        return self._ids(self._row(self.supersets_bits, grammar)
+                         & self._row(self.subsets_bits, grammar)
+                         & ~self._self_bit(grammar))
+
+    def _strict_supersets(self, grammar):
+        return self._row(self.supersets_bits, grammar) & ~self._row(self.subsets_bits, grammar)
+
+    def strict_supersets(self, grammar):
+        """Returns the set of grammars whose language is a proper superset of
+        L(grammar)."""
+        return self._ids(self._strict_supersets(grammar))
+
+    def minimal_supersets(self, grammar):
+        """Returns the proper supersets of L(grammar) that have no other
+        proper superset of L(grammar) as a proper subset."""
+        strict = self._strict_supersets(grammar)
+        minimal = set()
+        for h in self.supersets_bits.ids(strict).tolist():
+            strict_subsets = self._row(self.subsets_bits, h) & ~self._row(self.supersets_bits, h)
+            if not np.any(strict & strict_subsets):
+                minimal.add(h)
+        return minimal
+
+    def is_subset(self, g1, g2):
+        """Returns True if L(g1) is a subset of L(g2)."""
+        return self.supersets_bits.contains(g1, g2)
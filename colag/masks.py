@@ -0,0 +1,93 @@
+"""
+Irrelevance strings as bit masks.
+
+Each sentence's 13-character irrelevance string is stored as two 13-bit
+masks, using the same bit for each parameter as grammar ids do (parameter i
+of the string, counting from 0, is bit 12 - i):
+
+- relevant: the parameters whose character isn't '~'.
+- ambiguous: the parameters whose character is '*'.
+
+So a learner can find the parameters a sentence is relevant to with bit
+operations instead of comparing characters. `GRAMMAR_BITS[grammar]` is the
+tuple of the grammar's 13 parameter values (0 or 1), in string order.
+
+A learner's update rule gives each parameter of a sentence a multiplier of
+its learning rate, by the parameter's character in the irrelevance string
+(see learners/batch.py). `rate_multipliers` and `param_updates` turn masks
+into those multipliers, as a matrix for the vectorized learners and as
+(index, multiplier) pairs for the scalar ones.
+
+"""
+
+import numpy as np
+
+NUM_PARAMS = 13
+
+PLACE_VALUES = 1 << np.arange(NUM_PARAMS - 1, -1, -1)
+
+GRAMMAR_BITS = tuple(tuple((grammar >> (NUM_PARAMS - 1 - index)) & 1
+                           for index in range(NUM_PARAMS))
+                     for grammar in range(2 ** NUM_PARAMS))
+
+def masks_from_chars(chars):
+    """Returns (relevant, ambiguous) uint16 arrays of masks for a
+    (sentences x 13) array of irrelevance string characters (as uint8 ascii
+    codes)."""
+    chars = np.asarray(chars)
+    relevant = (chars != ord('~')).astype(np.int64) @ PLACE_VALUES
+    ambiguous = (chars == ord('*')).astype(np.int64) @ PLACE_VALUES
+    return relevant.astype(np.uint16), ambiguous.astype(np.uint16)
+
+def mask_table(sentence_ids, chars):
+    """Returns a uint16 array of shape (max sentence id + 1, 2): row s holds
+    the (relevant, ambiguous) masks of sentence s, given aligned sentence ids
+    and character rows. Rows of ids without a string are 0."""
+    sentence_ids = np.asarray(sentence_ids, dtype=np.int64)
+    table = np.zeros((sentence_ids.max() + 1 if len(sentence_ids) else 0, 2), dtype=np.uint16)
+    table[sentence_ids, 0], table[sentence_ids, 1] = masks_from_chars(chars)
+    return table
+
+def strings_to_chars(strings):
+    """Returns the (strings x 13) uint8 character array of a list of
+    irrelevance strings."""
+    if not strings:
+        return np.zeros((0, NUM_PARAMS), dtype=np.uint8)
+    return np.frombuffer(''.join(strings).encode('ascii'), dtype=np.uint8).reshape(len(strings), -1)
+
+def _check_rates(rates):
+    if rates['0'] != rates['1']:
+        raise ValueError('the masks cannot tell triggers for 0 from triggers for 1')
+
+def rate_multipliers(relevant, ambiguous, rates):
+    """Returns a (sentences x 13) float array of the learning rate multiplier
+    of each parameter of each sentence, given arrays of the sentences'
+    masks and `rates`, a dict mapping irrelevance string characters to
+    multipliers (like learners.batch.UpdateRule.rates)."""
+    _check_rates(rates)
+    relevant = (np.asarray(relevant, dtype=np.int64)[:, None] & PLACE_VALUES) != 0
+    ambiguous = (np.asarray(ambiguous, dtype=np.int64)[:, None] & PLACE_VALUES) != 0
+    return np.where(relevant, np.where(ambiguous, rates['*'], rates['0']), rates['~']) \
+        .astype(np.float64)
+
+def param_updates(relevant, ambiguous, rates):
+    """Returns the (index, multiplier) pairs of the parameters `rates` gives
+    a nonzero multiplier for a sentence with the given masks."""
+    _check_rates(rates)
+    updates = []
+    for index in range(NUM_PARAMS):
+        bit = 1 << (NUM_PARAMS - 1 - index)
+        char = '~' if not relevant & bit else '*' if ambiguous & bit else '0'
+        if rates[char]:
+            updates.append((index, rates[char]))
+    return tuple(updates)
+
+def update_table(relevant, ambiguous, rates):
+    """Returns a list indexed like `relevant` and `ambiguous` (arrays of
+    masks) of each sentence's `param_updates`. Sentences with the same masks
+    share a tuple."""
+    pairs = (np.asarray(relevant, dtype=np.int64) << NUM_PARAMS) | np.asarray(ambiguous, dtype=np.int64)
+    distinct, inverse = np.unique(pairs, return_inverse=True)
+    updates = [param_updates(pair >> NUM_PARAMS, pair & (2 ** NUM_PARAMS - 1), rates)
+               for pair in distinct.tolist()]
+    return [updates[i] for i in inverse.tolist()]
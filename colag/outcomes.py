@@ -0,0 +1,101 @@
+"""
+Classifying what a learner learned, relative to its target grammar.
+
+The "Augmented VLs" notebook read all-supersets.csv and all-equivs.csv into
+dicts of sets and classified each result row with DataFrame.apply. An
+`OutcomeClassifier` instead looks pairs up in the domain's equivalence class
+ids (colag/equivalence.py) and superset bit matrix (colag/lattice.py), so
+whole arrays of (target, hypothesis) pairs are classified with a few array
+operations. Each pair gets the first outcome that applies:
+
+- EXACT: the hypothesis is the target.
+- EQUIVALENT: another grammar with the same language.
+- SUPERSET: a grammar whose language properly contains the target's.
+- SUBSET: a grammar whose language is properly contained in the target's.
+- OTHER: any other grammar in the domain.
+- ILLEGAL: not a grammar in the domain.
+
+    classifier = OutcomeClassifier.from_domain(Colag.default())
+    outcomes = classifier.classify(results['grammar'], results['hypothesis'])
+    rows = with_outcomes(rows, classifier)  # rows in the RESULT_COLUMNS layout
+    outcomes = read_outcomes('results', classifier)  # learners/results.py
+
+"""
+
+import itertools
+
+import numpy as np
+
+EXACT, EQUIVALENT, SUPERSET, SUBSET, OTHER, ILLEGAL = range(6)
+
+OUTCOMES = ('exact', 'equivalent', 'superset', 'subset', 'other', 'illegal')
+
+class OutcomeClassifier:
+    """Classifies hypotheses against targets, given the domain's
+    colag.equivalence.EquivalenceClasses and the superset BitsetMatrix of its
+    colag.lattice.SupersetLattice."""
+    def __init__(self, equivalence_classes, supersets_bits):
+        self.equivalence_classes = equivalence_classes
+        self.supersets_bits = supersets_bits
+
+    @classmethod
+    def from_domain(cls, domain):
+        return cls(domain.equivalence_classes, domain.lattice.supersets_bits)
+
+    def legal(self, grammars):
+        """Returns a bool array: True for the grammars in the domain."""
+        grammars = np.asarray(grammars, dtype=np.int64)
+        rows = self.equivalence_classes.rows
+        inside = (grammars >= 0) & (grammars < len(rows))
+        legal = np.zeros(grammars.shape, dtype=bool)
+        legal[inside] = rows[grammars[inside]] >= 0
+        return legal
+
+    def classify(self, targets, hypotheses):
+        """Returns an int8 array with the outcome (an index into OUTCOMES) of
+        each aligned pair of target and hypothesis grammar ids. Targets must
+        be grammars in the domain."""
+        targets = np.asarray(targets, dtype=np.int64)
+        hypotheses = np.asarray(hypotheses, dtype=np.int64)
+        targets, hypotheses = np.broadcast_arrays(targets, hypotheses)
+        if not np.all(self.legal(targets)):
+            raise KeyError(np.unique(targets[~self.legal(targets)]).tolist())
+        outcomes = np.full(targets.shape, ILLEGAL, dtype=np.int8)
+        legal = self.legal(hypotheses)
+        t, h = targets[legal], hypotheses[legal]
+        classes = self.equivalence_classes
+        superset = self.supersets_bits.contains_many(t, h)
+        subset = self.supersets_bits.contains_many(h, t)
+        outcomes[legal] = np.select(
+            [t == h, classes.classes_of(t) == classes.classes_of(h), superset, subset],
+            [EXACT, EQUIVALENT, SUPERSET, SUBSET], OTHER)
+        return outcomes
+
+    def learned(self, targets, hypotheses):
+        """Returns the notebook's columns as bool arrays: learned_exact,
+        learned_equiv (the target or an equivalent) and learned_super (the
+        target, an equivalent or a superset)."""
+        outcomes = self.classify(targets, hypotheses)
+        return {'learned_exact': outcomes == EXACT,
+                'learned_equiv': outcomes <= EQUIVALENT,
+                'learned_super': outcomes <= SUPERSET}
+
+def outcome_names(outcomes):
+    """Returns an array of the names of an array of outcomes."""
+    return np.array(OUTCOMES)[np.asarray(outcomes)]
+
+def with_outcomes(rows, classifier, target_column=1, hypothesis_column=4, chunk_size=1000):
+    """Yields each results row (see learners.variational.RESULT_COLUMNS) with
+    the name of its outcome appended, classifying `chunk_size` rows at a
+    time (pass 1 to pass on slowly produced rows as soon as they come).
+    Rows from run_vl_on_languages, which have no learner column, need
+    target_column=0 and hypothesis_column=3."""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        outcomes = classifier.classify([int(row[target_column]) for row in chunk],
+                                       [int(row[hypothesis_column]) for row in chunk])
+        for row, outcome in zip(chunk, outcomes.tolist()):
+            yield list(row) + [OUTCOMES[outcome]]
@@ -0,0 +1,238 @@
+"""
+Batch computation of irrelevance strings for every sentence in the domain.
+
+This produces the same strings as `mark_irrelevant_params` in
+irrelevate_sentences.py, but for a block of sentences at a time using numpy
+instead of looping over parameters and generators in Python.
+
+Each sentence's generators are a bitset over all 8192 grammar ids (128 uint64
+words). Toggling parameter i of a grammar id is XOR with one bit, so the
+bitset of every generator's minimal pair is a fixed permutation of the bits:
+swapping whole words for the high bits, or shifting bits within each word for
+the low six. For each parameter:
+
+- 0 or 1: every generator has that value for the parameter.
+- *: some generator's minimal pair is legal but doesn't generate the
+  sentence.
+- ~: otherwise.
+
+The no-equiv and no-superset variants (see irrelevate_sentences.py) also
+count a minimal pair as missing when it is weakly equivalent to, or
+generates a superset of, the generator it was toggled from. For each
+parameter that relation is precomputed as a bitset of the grammars it holds
+for, so the variants cost the same as the normal strings.
+
+`write_variants` computes any of the variants in one pass, sharding blocks of
+sentences across a process pool and writing each file in sentence order as
+the blocks come back.
+
+"""
+
+import argparse
+import multiprocessing
+import os
+
+import numpy as np
+
+from colag.bitsets import pack_bool, unpack_bool
+from colag.colag import Colag
+
+NUM_PARAMS = 13
+NUM_GRAMMARS = 2 ** NUM_PARAMS
+NUM_WORDS = NUM_GRAMMARS // 64
+
+ZERO, ONE, AMBIGUOUS, IRRELEVANT = (ord(c) for c in '01*~')
+
+VARIANTS = ['normal', 'equiv', 'superset']
+
+OUTPUT_FILES = {'normal': 'irrelevance-output.txt',
+                'equiv': 'irrelevance-output-no-equiv.txt',
+                'superset': 'irrelevance-output-no-superset.txt'}
+
+# for bit b < 6, the bits of a word whose position has bit b clear
+LOW_MASKS = [np.uint64(m) for m in [0x5555555555555555, 0x3333333333333333,
+                                    0x0F0F0F0F0F0F0F0F, 0x00FF00FF00FF00FF,
+                                    0x0000FFFF0000FFFF, 0x00000000FFFFFFFF]]
+
+def param_bit(param):
+    """Returns the grammar id bit of `param` (0-indexed from the most
+    significant bit, like the irrelevance strings)."""
+    return NUM_PARAMS - param - 1
+
+def grammar_words(grammar_ids):
+    """Returns the 128-word bitset of `grammar_ids`."""
+    mask = np.zeros((1, NUM_GRAMMARS), dtype=bool)
+    mask[0, np.asarray(grammar_ids)] = True
+    return pack_bool(mask)[0]
+
+def toggled_words(words, bit):
+    """Returns the bitset {g ^ (1 << bit) for g in words}, over the last
+    axis of `words`."""
+    if bit >= 6:
+        return words[..., np.arange(NUM_WORDS) ^ (1 << (bit - 6))]
+    mask, shift = LOW_MASKS[bit], np.uint64(1 << bit)
+    return ((words >> shift) & mask) | ((words & mask) << shift)
+
+def bit_set_words(bit):
+    """Returns the bitset of every grammar id that has `bit` set."""
+    return grammar_words(np.flatnonzero((np.arange(NUM_GRAMMARS) >> bit) & 1))
+
+def incidence_words(colag):
+    """Returns a (sentences x 128) uint64 matrix: row k is the bitset of the
+    grammar ids that generate the k-th sentence of colag.generator_bits."""
+    language_bits = colag.language_bits
+    if not np.array_equal(language_bits.column_ids, colag.generator_bits.row_ids):
+        raise ValueError('language and generator matrices have different sentences')
+    incidence = np.zeros((len(language_bits.column_ids), NUM_WORDS), dtype=np.uint64)
+    for row, grammar in enumerate(language_bits.row_ids.tolist()):
+        sentences = np.flatnonzero(
+            unpack_bool(language_bits.words[row:row + 1], len(language_bits.column_ids))[0])
+        incidence[sentences, grammar >> 6] |= np.uint64(1 << (grammar & 63))
+    return incidence
+
+def ignored_pair_words(colag, variant):
+    """Returns a (13 x 128) uint64 matrix whose row for each parameter is the
+    bitset of grammars g whose minimal pair for that parameter doesn't count
+    as a generator in `variant`, or None for the normal variant."""
+    if variant == 'normal':
+        return None
+    grammars = colag.language_bits.row_ids
+    ignored = np.zeros((NUM_PARAMS, NUM_WORDS), dtype=np.uint64)
+    for param in range(NUM_PARAMS):
+        pairs = grammars ^ (1 << param_bit(param))
+        legal = np.isin(pairs, grammars)
+        g, h = grammars[legal], pairs[legal]
+        if variant == 'equiv':
+            classes = colag.equivalence_classes
+            related = classes.classes_of(g) == classes.classes_of(h)
+        elif variant == 'superset':
+            related = colag.lattice.supersets_bits.contains_many(g, h)
+        else:
+            raise ValueError('unknown irrelevance variant {}'.format(variant))
+        ignored[param] = grammar_words(g[related])
+    return ignored
+
+def relevance_block(incidence, legal, ignored=None):
+    """Returns a (sentences x 13) uint8 matrix of irrelevance string
+    characters for the sentences in `incidence`, where `legal` is the bitset
+    of grammars in the domain and `ignored` is from `ignored_pair_words`."""
+    chars = np.empty((incidence.shape[0], NUM_PARAMS), dtype=np.uint8)
+    for param in range(NUM_PARAMS):
+        bit = param_bit(param)
+        ones = bit_set_words(bit)
+        has_one = np.any(incidence & ones, axis=1)
+        has_zero = np.any(incidence & ~ones, axis=1)
+
+        column = np.where(has_one, ONE, ZERO).astype(np.uint8)
+        mixed = np.flatnonzero(has_one & has_zero)
+        generators = incidence[mixed]
+        missing_pairs = ~toggled_words(generators, bit)
+        if ignored is not None:
+            missing_pairs |= ignored[param]
+        legal_pairs = toggled_words(legal, bit)
+        ambiguous = np.any(generators & missing_pairs & legal_pairs, axis=1)
+        column[mixed] = np.where(ambiguous, AMBIGUOUS, IRRELEVANT)
+        chars[:, param] = column
+    return chars
+
+class RelevanceEngine:
+    """The precomputed state shared by every block of sentences: the
+    incidence bitsets, the legal grammars and each variant's ignored minimal
+    pairs."""
+    def __init__(self, colag, variants=('normal',)):
+        self.sentence_ids = colag.generator_bits.row_ids
+        self.incidence = incidence_words(colag)
+        self.legal = grammar_words(colag.language_bits.row_ids)
+        self.ignored = {variant: ignored_pair_words(colag, variant)
+                        for variant in variants}
+
+    def block(self, start, stop):
+        """Returns {variant: characters} for sentence positions start:stop."""
+        incidence = self.incidence[start:stop]
+        return {variant: relevance_block(incidence, self.legal, ignored)
+                for variant, ignored in self.ignored.items()}
+
+def relevance_matrix(colag, rows=None, variant='normal', block_size=4096):
+    """Returns a (sentences x 13) uint8 matrix of the irrelevance string
+    characters of the sentences at positions `rows` (by default, all
+    sentences) of colag.generator_bits."""
+    incidence = incidence_words(colag)
+    if rows is not None:
+        incidence = incidence[rows]
+    legal = grammar_words(colag.language_bits.row_ids)
+    ignored = ignored_pair_words(colag, variant)
+    chars = np.empty((len(incidence), NUM_PARAMS), dtype=np.uint8)
+    for start in range(0, len(incidence), block_size):
+        block = incidence[start:start + block_size]
+        chars[start:start + len(block)] = relevance_block(block, legal, ignored)
+    return chars
+
+def format_lines(sentence_ids, chars):
+    """Returns the irrelevance file lines ("<sentence id> <string>\\n") for
+    aligned sentence ids and character rows."""
+    return ['{} {}\n'.format(sid, row.tobytes().decode('ascii'))
+            for sid, row in zip(sentence_ids.tolist(), chars)]
+
+def write_irrelevance(handle, sentence_ids, chars):
+    handle.writelines(format_lines(sentence_ids, chars))
+
+_engine = None
+
+def _set_engine(engine):
+    global _engine
+    _engine = engine
+
+def _engine_block(bounds):
+    return _engine.block(*bounds)
+
+def write_variants(colag, outputs, processes=None, block_size=2048):
+    """Computes the irrelevance strings of every variant in `outputs` (a dict
+    of variant name -> file path) and writes them, sorted by sentence id.
+
+    Blocks of sentences are computed in a pool of `processes` worker
+    processes (by default, one per cpu; 1 computes them in this process).
+
+    """
+    engine = RelevanceEngine(colag, list(outputs))
+    bounds = [(start, min(start + block_size, len(engine.sentence_ids)))
+              for start in range(0, len(engine.sentence_ids), block_size)]
+    handles = {variant: open(path, 'w') for variant, path in outputs.items()}
+
+    def write_blocks(blocks):
+        for (start, stop), chars in zip(bounds, blocks):
+            for variant, handle in handles.items():
+                write_irrelevance(handle, engine.sentence_ids[start:stop], chars[variant])
+
+    try:
+        if processes == 1:
+            _set_engine(engine)
+            try:
+                write_blocks(map(_engine_block, bounds))
+            finally:
+                _set_engine(None)
+            return
+        with multiprocessing.Pool(processes, initializer=_set_engine,
+                                  initargs=(engine,)) as pool:
+            write_blocks(pool.imap(_engine_block, bounds))
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=""" Compute the irrelevance string of every sentence in colag. """)
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=VARIANTS,
+                        help='which irrelevance files to generate (default: all)')
+    parser.add_argument('--output-dir', default='.',
+                        help='directory to write {} to'.format(', '.join(OUTPUT_FILES.values())))
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (default: one per cpu)')
+    args = parser.parse_args()
+
+    colag = Colag.default()
+    outputs = {variant: os.path.join(args.output_dir, OUTPUT_FILES[variant])
+               for variant in args.variants}
+    write_variants(colag, outputs, processes=args.processes)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Independent, reproducible random streams derived from one master seed.
+
+Learners, sentence sources and the distance simulation draw from an `rng`
+they are given: a random.Random for the scalar code, or a numpy Generator for
+the vectorized code (learners/batch.py, learners/sentences.py,
+learners/sampling.py). The stream for each unit of work (a sweep task, a
+trial) is derived from the master seed and a key naming that unit, with
+numpy's SeedSequence, rather than from the order units happen to run in. So
+a sweep gives the same results serially, across any number of processes, or
+run one unit at a time.
+
+A random.Random is seeded with 128 bits of its SeedSequence's state, which
+is also the seed recorded with results. Two units would only share a stream
+if their 128-bit seeds were equal: with n units, that happens with
+probability about n**2 / 2**129, so not in any sweep that could be run.
+
+numpy streams use the counter-based Philox generator, so any number of
+values can be drawn in bulk into arrays without the streams overlapping.
+
+    rng = python_stream(seed, grammar, trial)
+    learner = RewardOnlyLearner(domain, rng=rng)
+    draws = numpy_stream(seed, grammar, trial).random((1000, 13))
+
+"""
+
+import random
+
+import numpy as np
+
+def seed_sequence(seed, *key):
+    """Returns the SeedSequence of the stream named by `key` (a tuple of
+    non-negative ints) under the master `seed`."""
+    return np.random.SeedSequence(seed, spawn_key=tuple(int(k) for k in key))
+
+SEED_WORDS = 4
+
+def stream_seed(seed, *key):
+    """Returns the 128-bit int seed of the stream named by `key`, to record
+    alongside results or to seed a random.Random."""
+    state = seed_sequence(seed, *key).generate_state(SEED_WORDS, np.uint32)
+    return int.from_bytes(state.astype('<u4').tobytes(), 'little')
+
+def python_stream(seed, *key):
+    """Returns a random.Random for the stream named by `key`. It produces the
+    same values as the random module after random.seed(stream_seed(seed, *key))."""
+    return random.Random(stream_seed(seed, *key))
+
+def numpy_stream(seed, *key):
+    """Returns a numpy Generator (Philox) for the stream named by `key`."""
+    return np.random.Generator(np.random.Philox(seed_sequence(seed, *key)))
@@ -0,0 +1,122 @@
+"""
+Bulk computation of grammar trigger vectors.
+
+A grammar's trigger vector counts, for each of the 13 parameters, how many of
+the sentences it generates are triggers for 0, triggers for 1, ambiguous (*)
+or irrelevant (~) with respect to that parameter, in TRIGGER_VEC_ORDER. The
+per-grammar `irrelevence_array` in colag.py builds a Counter per parameter
+column; here the irrelevance strings are first turned into a
+(sentences x 13) matrix of small integer codes, and the counts for every
+grammar come out of a single bincount over (grammar, parameter, code) cells.
+
+There are two weightings:
+
+- 'structures': one count per row of the colag tsv, i.e. per (grammar,
+  sentence, structure), as `irrelevence_array` over Colag.grammar_irr and the
+  notebooks' raw_colag count. This is Colag.trigger_matrix.
+- 'sentences': one count per (grammar, sentence), however many structures
+  the grammar assigns the sentence.
+
+`cached_trigger_matrix` keeps the matrices of a compiled domain in its
+directory, so they are only computed again when the irrelevance file changes.
+
+"""
+
+import os
+
+import numpy as np
+
+from colag.colag import TRIGGER_VEC_ORDER
+from colag.compiled import read_manifest, write_manifest
+
+NUM_CODES = len(TRIGGER_VEC_ORDER)
+
+WEIGHTINGS = ('structures', 'sentences')
+
+CODE_TABLE = np.full(256, -1, dtype=np.int8)
+for _code, _char in enumerate(TRIGGER_VEC_ORDER):
+    CODE_TABLE[ord(_char)] = _code
+
+def irrelevance_codes(characters):
+    """Converts an array of irrelevance string characters (as uint8 ascii
+    codes) into indices into TRIGGER_VEC_ORDER."""
+    codes = CODE_TABLE[np.asarray(characters)]
+    if np.any(codes < 0):
+        raise ValueError('unexpected character in irrelevance strings')
+    return codes
+
+def strings_to_codes(strings):
+    """Converts a list of equal-length irrelevance strings into a code
+    matrix, one row per string."""
+    if not strings:
+        return np.zeros((0, 0), dtype=np.int8)
+    characters = np.frombuffer(''.join(strings).encode('ascii'), dtype=np.uint8)
+    return irrelevance_codes(characters.reshape(len(strings), -1))
+
+def trigger_counts(grammar_rows, codes, num_grammars, weights=None):
+    """Returns a (num_grammars x num_params * NUM_CODES) matrix of trigger
+    counts.
+
+    `grammar_rows` and `codes` are aligned: codes[k] is the row of irrelevance
+    codes of one sentence generated by grammar row grammar_rows[k]. `weights`
+    optionally counts each of those observations more than once.
+
+    """
+    grammar_rows = np.asarray(grammar_rows, dtype=np.int64)
+    num_params = codes.shape[1]
+    cells = (grammar_rows[:, None] * num_params + np.arange(num_params)) * NUM_CODES + codes
+    if weights is not None:
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64)[:, None], cells.shape).ravel()
+    counts = np.bincount(cells.ravel(), weights, minlength=num_grammars * num_params * NUM_CODES)
+    return counts.astype(np.int64).reshape(num_grammars, -1)
+
+def trigger_matrix_from_strings(grammar_ids, grammar_irr):
+    """Returns the trigger matrix for `grammar_ids` from a mapping of grammar
+    id -> list of irrelevance strings, like Colag.grammar_irr."""
+    strings = [grammar_irr[g] for g in grammar_ids]
+    rows = np.repeat(np.arange(len(strings)), [len(s) for s in strings])
+    codes = strings_to_codes([s for group in strings for s in group])
+    return trigger_counts(rows, codes, len(strings))
+
+def trigger_matrix_from_compiled(compiled, weighting='structures'):
+    """Returns the trigger matrix of a colag.compiled.CompiledDomain, one row
+    per grammar in compiled.grammar_ids, with the given weighting (see
+    WEIGHTINGS)."""
+    if weighting not in WEIGHTINGS:
+        raise ValueError('unknown trigger weighting {!r}'.format(weighting))
+    num_grammars = len(compiled.grammar_ids)
+    rows = np.repeat(np.arange(num_grammars), np.diff(compiled.language_offsets))
+    sentence_rows = compiled.sentence_rows[compiled.language_sentences]
+    codes = irrelevance_codes(compiled.irrelevance)[sentence_rows]
+    weights = compiled.structure_counts if weighting == 'structures' else None
+    return trigger_counts(rows, codes, num_grammars, weights=weights)
+
+def trigger_cache_name(compiled, weighting):
+    return 'triggers-{}-{}'.format(compiled.irrelevance_key, weighting)
+
+def cached_trigger_matrix(compiled, weighting='structures'):
+    """Returns trigger_matrix_from_compiled(compiled, weighting), read from
+    the compiled directory if it was saved there from the same domain and
+    irrelevance files. Otherwise computes it and saves it there (if the
+    directory is writable)."""
+    name = trigger_cache_name(compiled, weighting)
+    path = os.path.join(compiled.path, name + '.npy')
+    stamp = {'domain': compiled.manifest['domain'],
+             'irrelevance': compiled.manifest['irrelevance'][compiled.irrelevance_key]}
+    manifest = read_manifest(compiled.path) or {}
+    if manifest.get('triggers', {}).get(name) == stamp:
+        try:
+            return np.load(path)
+        except (OSError, ValueError):
+            pass
+    matrix = trigger_matrix_from_compiled(compiled, weighting)
+    try:
+        tmp = path + '.tmp.npy'
+        np.save(tmp, matrix)
+        os.replace(tmp, path)
+        manifest = read_manifest(compiled.path)
+        manifest.setdefault('triggers', {})[name] = stamp
+        write_manifest(compiled.path, manifest)
+    except OSError:
+        pass
+    return matrix
@@ -0,0 +1,196 @@
+"""
+A vectorized engine that runs a whole population of variational learners in
+lockstep.
+
+`learn_language` in variational.py runs one learner at a time, with a few
+Python calls per sentence. Here a population of learners is a
+(learners x 13) weight array. On every step each learner that is still
+running draws a sentence from the target language and a hypothesis grammar
+from its weights, parse success is a lookup into the domain's
+grammar x sentence bit matrix, and the reward or punishment is applied to
+every learner at once. Learners stop individually, exactly as in
+`learn_language`: when their weights converge, or after `iterations`
+sentences. As in VariationalLearner, `converged_at` holds the number of
+sentences each learner had consumed when each weight last came within the
+threshold.
+
+Each learner class is described by an `UpdateRule`: whether it updates on
+parse success or failure, and how much each parameter's learning rate is
+scaled given the sentence's irrelevance string (the learner class's `rates`,
+precomputed per sentence from its masks, see colag/masks.py). The results have the same
+distribution as running the learners one at a time.
+
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from colag.colag import Colag
+from colag.masks import rate_multipliers
+from colag.streams import numpy_stream, stream_seed
+from learners.sentences import SentenceDistribution
+from learners.variational import (PunishOnlyLearner, RewardOnlyLearner,
+                                  RewardOnlyRelevantLearner,
+                                  SkepticalRewardOnlyLearner)
+
+class UpdateRule:
+    """How a learner class updates its weights.
+
+    - on_success: True if the learner moves towards the hypothesis grammar
+      when it parses the sentence, False if it moves away from it when it
+      doesn't.
+    - rates: a dict mapping irrelevance string characters to a multiplier
+      of the learning rate for that parameter.
+    """
+    def __init__(self, on_success, rates):
+        self.on_success = on_success
+        self.rates = rates
+
+UPDATE_RULES = {
+    RewardOnlyLearner: UpdateRule(True, RewardOnlyLearner.rates),
+    RewardOnlyRelevantLearner: UpdateRule(True, RewardOnlyRelevantLearner.rates),
+    SkepticalRewardOnlyLearner: UpdateRule(True, SkepticalRewardOnlyLearner.rates),
+    PunishOnlyLearner: UpdateRule(False, PunishOnlyLearner.rates),
+}
+
+def update_rule(Learner):
+    """Returns the UpdateRule of `Learner` or its nearest supported base
+    class."""
+    for cls in Learner.__mro__:
+        if cls in UPDATE_RULES:
+            return UPDATE_RULES[cls]
+    raise ValueError('no batch update rule for {}'.format(Learner.__name__))
+
+def legal_mask(domain):
+    """Returns a bool array over all grammar ids, True for legal grammars."""
+    legal = np.zeros(2 ** domain.num_params, dtype=bool)
+    legal[np.array(sorted(domain.language))] = True
+    return legal
+
+def choose_grammars(weights, legal, rng):
+    """Draws one legal grammar per row of `weights` by rejection sampling,
+    like VariationalLearner.choose_grammar. Returns (grammar ids, 0/1 param
+    matrix)."""
+    num_params = weights.shape[1]
+    place_values = 1 << np.arange(num_params - 1, -1, -1)
+    bits = np.empty(weights.shape, dtype=np.int8)
+    grammars = np.empty(len(weights), dtype=np.int64)
+    todo = np.arange(len(weights))
+    while len(todo):
+        draw = rng.random((len(todo), num_params)) < weights[todo]
+        bits[todo] = draw
+        grammars[todo] = draw @ place_values
+        todo = todo[~legal[grammars[todo]]]
+    return grammars, bits
+
+class BatchSimulation:
+    """A population of `num_learners` learners of class `Learner` learning
+    the language of `target_grammar`, drawing its sentences from
+    `distribution` (a learners.sentences.SentenceDistribution) if given, and
+    otherwise uniformly."""
+    def __init__(self, domain, Learner, target_grammar, num_learners,
+                 learning_rate=.001, threshold=0.02, rng=None, distribution=None):
+        self.domain = domain
+        self.Learner = Learner
+        self.rule = update_rule(Learner)
+        self.target_grammar = target_grammar
+        self.learning_rate = learning_rate
+        self.threshold = threshold
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.legal = legal_mask(domain)
+
+        if distribution is None:
+            distribution = SentenceDistribution(domain.language[target_grammar], rng=self.rng)
+        self.distribution = distribution
+        self.language = distribution.sentences
+        self.rates = learning_rate * rate_multipliers(
+            *domain.relevance_masks[self.language].T, self.rule.rates)
+        self.parses = domain.language_bits.contains_many
+
+        self.weights = np.full((num_learners, domain.num_params), 0.5)
+        self.consumed = np.zeros(num_learners, dtype=np.int64)
+        # every running learner has consumed `steps` sentences
+        self.steps = 0
+        settled = self.settled(self.weights)
+        self.converged_at = np.where(settled, 0, -1)
+        self.running = np.flatnonzero(~np.all(settled, axis=1))
+
+    def settled(self, weights):
+        """Returns a bool array like `weights`: True where the weight is
+        within `threshold` of 0 or 1."""
+        return (weights <= self.threshold) | (weights >= 1 - self.threshold)
+
+    def step(self, iterations):
+        """Has every running learner consume one sentence."""
+        running = self.running
+        weights = self.weights[running]
+        sentences = self.distribution.indices(len(running))
+        hypotheses, bits = choose_grammars(weights, self.legal, self.rng)
+        success = self.parses(hypotheses, self.language[sentences])
+
+        update = success if self.rule.on_success else ~success
+        target = bits[update] if self.rule.on_success else 1 - bits[update]
+        weights[update] += self.rates[sentences[update]] * (target - weights[update])
+        self.weights[running] = weights
+
+        self.steps += 1
+        settled = self.settled(weights)
+        converged_at = self.converged_at[running]
+        converged_at[settled & (converged_at < 0)] = self.steps
+        converged_at[~settled] = -1
+        self.converged_at[running] = converged_at
+
+        at_limit = self.consumed[running] >= iterations
+        self.consumed[running[~at_limit]] += 1
+        done = at_limit | np.all(settled, axis=1)
+        self.running = running[~done]
+
+    def run(self, iterations):
+        """Runs until every learner has converged or consumed `iterations`
+        sentences. Returns the number of sentences each learner consumed,
+        counted as in `learn_language`."""
+        while len(self.running):
+            self.step(iterations)
+        return self.consumed
+
+    def hypotheses(self):
+        """Draws one hypothesis grammar per learner from its final weights."""
+        return choose_grammars(self.weights, self.legal, self.rng)[0]
+
+def run_batch_on_languages(Learner, grammar_ids, num_learners, num_sentences,
+                           domain=None, rng=None, distribution=None, seed=None):
+    """A vectorized `run_vl_on_languages`: yields the same rows, but runs all
+    `num_learners` trials on each grammar as one population. The runtime
+    column is the runtime of the whole population.
+
+    With a master `seed`, each grammar's population draws from its own
+    stream (see colag/streams.py) instead of `rng`, and the stream's seed is
+    recorded in the rows.
+    """
+    domain = domain or Colag.default()
+    for grammar in grammar_ids:
+        start = datetime.now()
+        population_seed = ''
+        if seed is not None:
+            rng = numpy_stream(seed, grammar)
+            population_seed = stream_seed(seed, grammar)
+        sentences = None
+        if distribution is not None:
+            sentences = distribution(domain.language[grammar])
+            if seed is not None:
+                sentences = sentences.with_rng(rng)
+        sim = BatchSimulation(domain, Learner, grammar, num_learners, rng=rng,
+                              distribution=sentences)
+        consumed = sim.run(num_sentences)
+        hypotheses = sim.hypotheses()
+        runtime = datetime.now() - start
+        for trial_num in range(num_learners):
+            result = [grammar,
+                      trial_num,
+                      int(consumed[trial_num]),
+                      int(hypotheses[trial_num])]
+            result += sim.weights[trial_num].tolist()
+            result += [population_seed, runtime]
+            result += sim.converged_at[trial_num].tolist()
+            yield result
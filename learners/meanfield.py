@@ -0,0 +1,157 @@
+"""
+Expected ("mean-field") dynamics of the variational learners.
+
+A reward-only learner's update depends only on its current weights and on
+which grammar/sentence pairs parse: it draws a legal grammar g with
+probability P(g | w) (see learners/sampling.py), a target sentence s with
+probability p(s), and if g parses s moves each weight w_i towards g's value
+b_i(g) at rate r * m_i(s), where m_i(s) is the learning rate multiplier the
+learner gives parameter i for s (see learners/batch.py). So the expected
+change of w_i per sentence is
+
+    r * sum_g P(g | w) A_gi (b_i(g) - w_i),  where  A_gi = sum_s p(s) parses(g, s) m_i(s)
+
+A only depends on the target language, so `ExpectedDynamics` computes it
+once (a punish-only learner uses the sentences g doesn't parse instead).
+After that each step costs a pass over the legal grammars, however many
+sentences it stands for:
+
+- `integrate` follows the mean-field ODE dw/dn = drift(w) with Euler steps
+  of `step` sentences, giving a deterministic estimate of the learning curve
+  and the number of sentences to convergence.
+- `simulate` jumps `step` sentences at a time, drawing how many times each
+  grammar was chosen (multinomial) and how many of those parsed (binomial),
+  and applying their updates at once. This keeps some of the run-to-run
+  noise. The updates within a jump are applied to first order in the
+  learning rate, so `step` times the learning rate should stay small.
+
+Both are only estimates of the sentence-by-sentence simulation, but they are
+orders of magnitude faster, which makes them useful for sweeping learning
+rates and thresholds before running the full simulation. On the test
+domain (see tests/test_meanfield.py), the median of `simulate` lands within
+about 10% of the simulated median convergence time. `integrate` follows the
+mean path, which misses the noise that lets half the learners converge
+sooner, and is off by up to about 30%.
+
+"""
+
+import numpy as np
+
+from colag.masks import rate_multipliers
+from learners.batch import update_rule
+from learners.sampling import grammar_bits
+from learners.sentences import SentenceDistribution
+
+def sentence_rates(domain, rule, sentences):
+    """Returns a (sentences x params) array of the learning rate multiplier
+    `rule` gives each parameter for each sentence."""
+    return rate_multipliers(*domain.relevance_masks[np.asarray(sentences)].T, rule.rates)
+
+def parse_matrix(domain, grammars, sentences):
+    """Returns a (grammars x sentences) bool array: True where the grammar
+    parses the sentence. `grammars` must be sorted."""
+    parses = np.zeros((len(grammars), len(sentences)), dtype=bool)
+    for column, sentence in enumerate(sentences.tolist()):
+        generators = np.array(sorted(domain.sentences[sentence]), dtype=np.int64)
+        parses[np.searchsorted(grammars, generators), column] = True
+    return parses
+
+class ExpectedDynamics:
+    """The expected dynamics of a `Learner` learning the language of
+    `target_grammar`, with sentences drawn from `distribution` (a
+    learners.sentences.SentenceDistribution; by default, uniform)."""
+    def __init__(self, domain, Learner, target_grammar, learning_rate=.001,
+                 threshold=0.02, distribution=None):
+        self.rule = update_rule(Learner)
+        self.learning_rate = learning_rate
+        self.threshold = threshold
+        self.num_params = domain.num_params
+        if distribution is None:
+            distribution = SentenceDistribution(domain.language[target_grammar])
+        sentences = distribution.sentences
+
+        self.grammars = np.array(sorted(domain.language), dtype=np.int64)
+        bits = grammar_bits(self.grammars, domain.num_params).astype(np.float64)
+        parses = parse_matrix(domain, self.grammars, sentences)
+        updates = parses if self.rule.on_success else ~parses
+        # the value each grammar's updates move the weights towards
+        self.targets = bits if self.rule.on_success else 1 - bits
+        self.bits = bits
+        # the probability a sentence drawn for grammar g leads to an update,
+        # and A from the module docstring
+        self.update_probs = np.clip(updates.astype(np.float64) @ distribution.probabilities, 0, 1)
+        self.update_rates = updates.astype(np.float64) @ (
+            distribution.probabilities[:, None] * sentence_rates(domain, self.rule, sentences))
+        # the mean rate multipliers of one update from each grammar
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.mean_rates = np.where(self.update_probs[:, None] > 0,
+                                       self.update_rates / self.update_probs[:, None], 0)
+
+    def probabilities(self, weights):
+        """Returns the probability of choosing each legal grammar."""
+        weights = np.clip(weights, 1e-300, 1 - 1e-16)
+        log_p = self.bits @ (np.log(weights) - np.log1p(-weights))
+        p = np.exp(log_p - log_p.max())
+        return p / p.sum()
+
+    def drift(self, weights):
+        """Returns the expected change in each weight from one sentence."""
+        p = self.probabilities(weights)
+        return self.learning_rate * (
+            p @ (self.update_rates * self.targets) - (p @ self.update_rates) * weights)
+
+    def converged(self, weights):
+        return bool(np.all((weights <= self.threshold) | (weights >= 1 - self.threshold)))
+
+    def integrate(self, max_sentences, step=None, weights=None):
+        """Integrates the mean-field ODE for up to `max_sentences` sentences,
+        `step` sentences at a time (by default, 1 / (20 * learning rate)).
+
+        Returns (sentences, weights, converged_at): the number of sentences
+        at each step, the weights there, and the number of sentences after
+        which the weights converged (None if they didn't).
+        """
+        return self._run(max_sentences, step, weights, lambda w, k: w + k * self.drift(w))
+
+    def simulate(self, max_sentences, step=None, weights=None, rng=None):
+        """Like `integrate`, but draws the updates of each `step` sentences
+        at random (see the module docstring)."""
+        rng = rng if rng is not None else np.random.default_rng()
+        return self._run(max_sentences, step, weights,
+                         lambda w, k: self.jump(w, k, rng))
+
+    def jump(self, weights, sentences, rng):
+        """Returns the weights after `sentences` sentences, drawing the
+        number of updates from each grammar at random."""
+        chosen = rng.multinomial(sentences, self.probabilities(weights))
+        updated = rng.binomial(chosen, self.update_probs)
+        rates = updated @ self.mean_rates
+        moves = updated @ (self.mean_rates * self.targets)
+        return np.clip(weights + self.learning_rate * (moves - rates * weights), 0, 1)
+
+    def _run(self, max_sentences, step, weights, advance):
+        if step is None:
+            step = max(1, int(round(1 / (20 * self.learning_rate))))
+        weights = np.full(self.num_params, 0.5) if weights is None else np.asarray(weights, dtype=np.float64)
+        sentences, path = [0], [weights]
+        n = 0
+        while n < max_sentences and not self.converged(weights):
+            k = min(step, max_sentences - n)
+            weights = advance(weights, k)
+            n += k
+            sentences.append(n)
+            path.append(weights)
+        converged_at = n if self.converged(weights) else None
+        return np.array(sentences), np.array(path), converged_at
+
+def convergence_estimates(domain, Learner, target_grammar, learning_rates,
+                          max_sentences=5000000, threshold=0.02, distribution=None):
+    """Returns {learning rate: mean-field estimate of the number of sentences
+    to convergence (None if more than `max_sentences`)}."""
+    dynamics = ExpectedDynamics(domain, Learner, target_grammar, threshold=threshold,
+                                distribution=distribution)
+    estimates = {}
+    for rate in learning_rates:
+        dynamics.learning_rate = rate
+        estimates[rate] = dynamics.integrate(max_sentences)[2]
+    return estimates
@@ -0,0 +1,212 @@
+"""
+A columnar store for simulation results.
+
+A results store is a directory of compressed chunks. Each chunk is an .npz
+file holding one array per column of RESULT_DTYPE, so a reader can load just
+the columns it needs, and millions of rows load as numpy arrays instead of
+being parsed out of CSV text. Rows are the same as the rows `run_sim` and
+learners/sweep.py write to CSV (see variational.RESULT_COLUMNS), except:
+
+- the learner is stored as a code into a table of learner names kept in
+  each chunk; read_results renumbers the codes of every chunk into the
+  table learner_names returns.
+- the runtime is stored in seconds.
+- the seed (a 128-bit int, see colag/streams.py) is stored as 16
+  big-endian bytes (see decode_seed).
+
+Rows from CSVs written before the convergence times and seeds were added
+get -1 and b'' for them.
+
+    with ResultsWriter('results') as writer:
+        writer.extend(rows)
+    results = read_results('results', columns=['learner', 'grammar', 'sentences'])
+    names = learner_names('results')
+    reward_only = results[names[results['learner']] == 'RewardOnlyLearner']
+
+Rows are buffered and written a chunk at a time. Opening a writer on an
+existing store adds chunks after the ones already there.
+
+"""
+
+import argparse
+import csv
+import glob
+import os
+from datetime import timedelta
+
+import numpy as np
+
+from colag.colag import parameters
+
+RESULT_DTYPE = np.dtype([('learner', np.int8),
+                         ('grammar', np.int16),
+                         ('trial', np.int32),
+                         ('sentences', np.int64),
+                         ('hypothesis', np.int16)]
+                        + [(param, np.float64) for param in parameters]
+                        + [('seed', 'S16'),
+                           ('runtime', np.float64)]
+                        + [(param + '_converged_at', np.int64) for param in parameters])
+
+CHUNK_PATTERN = 'chunk-{:06d}.npz'
+
+def runtime_seconds(runtime):
+    """Returns a runtime given as a timedelta or as its str() in seconds."""
+    if isinstance(runtime, timedelta):
+        return runtime.total_seconds()
+    hours, minutes, seconds = str(runtime).split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def encode_seed(seed):
+    """Returns a seed given as an int or as its decimal str() (or '' for no
+    seed) as stored in the seed column."""
+    return int(seed).to_bytes(16, 'big') if seed != '' else b''
+
+def decode_seed(value):
+    """Returns the int seed stored as `value` in the seed column, or None if
+    it has none. (numpy drops the trailing zero bytes of 'S16' values, so a
+    seed of 0 reads back as none; stream_seed practically never gives one.)"""
+    return int.from_bytes(value.ljust(16, b'\0'), 'big') if value else None
+
+def rows_to_records(rows):
+    """Returns a RESULT_DTYPE array of rows in the RESULT_COLUMNS layout (as
+    values, or as strings read back from a CSV), and the list of learner
+    names its learner codes index."""
+    records = np.empty(len(rows), dtype=RESULT_DTYPE)
+    codes = {}
+    for i, row in enumerate(rows):
+        weights = [float(w) for w in row[5:18]]
+        converged_at = [int(c) for c in row[20:33]] or [-1] * len(parameters)
+        learner = codes.setdefault(row[0], len(codes))
+        records[i] = (learner, int(row[1]), int(row[2]), int(row[3]), int(row[4]),
+                      *weights, encode_seed(row[18]), runtime_seconds(row[19]), *converged_at)
+    return records, list(codes)
+
+def chunk_paths(path):
+    return sorted(glob.glob(os.path.join(path, CHUNK_PATTERN.replace('{:06d}', '*'))))
+
+class ResultsWriter:
+    """Appends rows to the results store at `path`, writing a chunk every
+    `chunk_size` rows."""
+    def __init__(self, path, chunk_size=100000):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.rows = []
+        os.makedirs(path, exist_ok=True)
+        self.next_chunk = len(chunk_paths(path))
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def flush(self):
+        """Writes the buffered rows as a new chunk."""
+        if not self.rows:
+            return
+        records, names = rows_to_records(self.rows)
+        chunk = os.path.join(self.path, CHUNK_PATTERN.format(self.next_chunk))
+        tmp = chunk + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, learner_names=np.array(names),
+                                **{name: records[name] for name in RESULT_DTYPE.names})
+        os.replace(tmp, chunk)
+        self.next_chunk += 1
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def chunk_learners(data, table):
+    """Returns the learner codes of a loaded chunk renumbered into `table`, a
+    dict from learner name to code that gains any names it lacks. Chunks
+    written by older versions store the names themselves."""
+    learners = data['learner']
+    if 'learner_names' in data:
+        names = data['learner_names'].tolist()
+    else:
+        names, learners = np.unique(learners, return_inverse=True)
+        names = names.tolist()
+    codes = np.array([table.setdefault(name, len(table)) for name in names], dtype=np.int8)
+    return codes[learners]
+
+def chunk_seeds(data):
+    """Returns the seed column of a loaded chunk. Chunks written by older
+    versions store seeds as decimal strings."""
+    seeds = data['seed']
+    if seeds.dtype.kind == 'U':
+        seeds = np.array([encode_seed(seed) for seed in seeds.tolist()], dtype='S16')
+    return seeds
+
+def learner_names(path):
+    """Returns an array of the learner names the learner codes read_results
+    returns for the results store at `path` index."""
+    table = {}
+    for chunk in chunk_paths(path):
+        with np.load(chunk) as data:
+            chunk_learners(data, table)
+    return np.array(list(table), dtype=str)
+
+def read_results(path, columns=None):
+    """Returns a structured array of every row in the results store at
+    `path`, with only the fields in `columns` (by default, all of them).
+    Learners are codes into the table learner_names returns. Columns
+    missing from chunks written by older versions are -1 (or b'' for the
+    seed)."""
+    columns = list(columns or RESULT_DTYPE.names)
+    dtype = np.dtype([(name, RESULT_DTYPE[name]) for name in columns])
+    chunks = []
+    table = {}
+    for chunk in chunk_paths(path):
+        with np.load(chunk) as data:
+            arrays = {name: data[name] for name in columns
+                      if name in data and name not in ('learner', 'seed')}
+            if 'learner' in columns:
+                arrays['learner'] = chunk_learners(data, table)
+            if 'seed' in columns and 'seed' in data:
+                arrays['seed'] = chunk_seeds(data)
+            size = len(data['grammar'])
+        records = np.empty(size, dtype=dtype)
+        for name in columns:
+            records[name] = arrays.get(name, b'' if name == 'seed' else -1)
+        chunks.append(records)
+    if not chunks:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(chunks)
+
+def read_outcomes(path, classifier):
+    """Returns the outcome (see colag/outcomes.py) of every row in the
+    results store at `path`, in the order read_results returns them."""
+    results = read_results(path, columns=['grammar', 'hypothesis'])
+    return classifier.classify(results['grammar'], results['hypothesis'])
+
+def convert_csv(csv_path, path, chunk_size=100000):
+    """Adds the rows of a results CSV (like learner_results.csv) to the
+    results store at `path`, skipping header rows."""
+    with open(csv_path, newline='') as f, ResultsWriter(path, chunk_size) as writer:
+        for row in csv.reader(f):
+            if row and row[1] != 'Grammar ID':
+                writer.append(row)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=""" Convert results CSVs into a columnar results store. """)
+    parser.add_argument('csvs', nargs='+')
+    parser.add_argument('output', help='results store directory')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    args = parser.parse_args()
+    for csv_path in args.csvs:
+        convert_csv(csv_path, args.output, args.chunk_size)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Exact sampling of hypothesis grammars from a variational learner's weights.
+
+`VariationalLearner.choose_grammar` flips 13 weighted coins and starts over
+whenever the result is one of the ~5000 grammar ids that aren't in the
+domain. When the weights put most of their mass on illegal grammars that loop
+can run many times per sentence.
+
+`LegalGrammarSampler` instead computes the probability the weights give each
+legal grammar, renormalizes over the legal grammars (which is exactly the
+distribution the rejection loop samples from), and draws from it by a
+binary search of the cumulative distribution with one uniform draw from the
+learner's rng, so seeded learners stay reproducible (see colag/streams.py).
+Building the distribution costs a few array operations over the 3072 legal
+grammars, so it is only rebuilt when some weight has moved more than
+`tolerance` since the last build: with the default of 0.01 and a learning
+rate of .001, at most once every ten updates. With a tolerance of 0 every
+draw is exact.
+
+    learner = RewardOnlyLearner(domain, sampler=LegalGrammarSampler(domain), rng=rng)
+
+"""
+
+import random
+
+import numpy as np
+
+def alias_table(probabilities):
+    """Returns (prob, alias) arrays for Walker's alias method (Vose's
+    construction) over `probabilities`, which must sum to 1."""
+    n = len(probabilities)
+    scaled = (np.asarray(probabilities, dtype=np.float64) * n).tolist()
+    prob = [1.0] * n
+    alias = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1]
+    large = [i for i, p in enumerate(scaled) if p >= 1]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] = scaled[l] + scaled[s] - 1
+        if scaled[l] < 1:
+            small.append(l)
+        else:
+            large.append(l)
+    return np.array(prob), np.array(alias, dtype=np.int64)
+
+def grammar_bits(grammars, num_params=13):
+    """Returns a (len(grammars) x num_params) 0/1 matrix of each grammar's
+    parameter values, in weight order (parameter 1, the most significant
+    bit, first)."""
+    shifts = np.arange(num_params - 1, -1, -1)
+    return (np.asarray(grammars)[:, None] >> shifts) & 1
+
+class LegalGrammarSampler:
+    """Draws legal grammars with the probability the rejection loop in
+    `VariationalLearner.choose_grammar` would give them. Each learner needs
+    its own sampler."""
+    def __init__(self, domain, tolerance=0.01):
+        self.grammars = np.array(sorted(domain.language), dtype=np.int64)
+        self.grammar_list = self.grammars.tolist()
+        self.bits = grammar_bits(self.grammars, domain.num_params).astype(bool)
+        self.bits_float = self.bits.astype(np.float64)
+        self.tolerance = tolerance
+        self.table_weights = None
+        self.cdf = None
+
+    def probabilities(self, weights):
+        """Returns the probability of each legal grammar given `weights`,
+        conditioned on the grammar being legal."""
+        weights = np.asarray(weights, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            log_one, log_zero = np.log(weights), np.log1p(-weights)
+        if np.all(np.isfinite(log_one) & np.isfinite(log_zero)):
+            log_p = self.bits_float @ (log_one - log_zero) + log_zero.sum()
+        else:
+            log_p = np.where(self.bits, log_one, log_zero).sum(axis=1)
+        if not np.isfinite(log_p.max()):
+            raise ValueError('weights give every legal grammar probability 0')
+        p = np.exp(log_p - log_p.max())
+        return p / p.sum()
+
+    def rebuild(self, weights):
+        self.cdf = np.cumsum(self.probabilities(weights))
+        self.total = float(self.cdf[-1])
+        self.table_weights = list(weights)
+
+    def stale(self, weights):
+        if self.table_weights is None:
+            return True
+        tolerance = self.tolerance
+        for w, t in zip(weights, self.table_weights):
+            if abs(w - t) > tolerance:
+                return True
+        return False
+
+    def sample(self, weights, rng=random):
+        """Returns a grammar id drawn according to `weights`, with one
+        rng.random() draw from `rng` (a random.Random, or the random module)."""
+        if self.stale(weights):
+            self.rebuild(weights)
+        index = int(self.cdf.searchsorted(rng.random() * self.total, 'right'))
+        return self.grammar_list[min(index, len(self.grammar_list) - 1)]
+
+    def sample_many(self, weights, size, rng):
+        """Returns an array of `size` grammar ids drawn according to
+        `weights`, using `rng`, a numpy Generator."""
+        if self.stale(weights):
+            self.rebuild(weights)
+        index = self.cdf.searchsorted(rng.random(size) * self.total, 'right')
+        return self.grammars[np.minimum(index, len(self.grammars) - 1)]
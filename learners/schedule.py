@@ -0,0 +1,223 @@
+"""
+Adaptive sweeps over learner settings.
+
+A sweep runs trials in every cell of a grid of (learner, target grammar,
+learning rate, threshold, max sentences) settings. Rather than giving every
+cell the same number of trials, `SweepScheduler` keeps running statistics of
+the number of sentences each cell's trials took, and stops giving a cell
+trials once the confidence interval of its mean is narrow enough: its half
+width is at most `rel_tol` times the mean. Cells with noisy results get
+trials first, so the compute goes where the variance is.
+
+Each round, the scheduler hands out a batch of trials across the cells that
+still need them, `run_schedule` runs them across a process pool (like
+learners/sweep.py, with a seed per trial), and their results update the
+statistics.
+
+    cells = grid([RewardOnlyLearner], [611], [.001, .005], [.02, .05], [500000])
+    scheduler = SweepScheduler(cells, min_trials=10, max_trials=200)
+    run_schedule(domain, scheduler)
+    write_summary('sweep.csv', scheduler)
+
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing
+import random
+from collections import namedtuple
+
+from colag.colag import Colag
+from colag.streams import stream_seed
+from learners.sampling import LegalGrammarSampler
+from learners.summaries import RunningStats
+from learners.sweep import LEARNERS, LEARNERS_BY_NAME
+from learners.variational import learn_language
+
+Cell = namedtuple('Cell', ['learner', 'grammar', 'learning_rate', 'threshold', 'max_sentences'])
+
+Trial = namedtuple('Trial', ['cell', 'index', 'seed'])
+
+def grid(learners, grammars, learning_rates, thresholds, max_sentences):
+    """Returns a cell for each combination of settings. `learners` are
+    learner classes or their names."""
+    names = [getattr(learner, '__name__', learner) for learner in learners]
+    return [Cell(*settings) for settings in
+            itertools.product(names, grammars, learning_rates, thresholds, max_sentences)]
+
+class CellStats(RunningStats):
+    """Running mean and variance of the number of sentences a cell's trials
+    took, and how many of them converged."""
+    def __init__(self):
+        super().__init__()
+        self.converged = 0
+
+    def add(self, sentences, converged):
+        super().add(sentences)
+        self.converged += int(converged)
+
+    @property
+    def trials(self):
+        return self.count
+
+    def half_width(self, z=1.96):
+        """Returns the half width of the normal confidence interval of the
+        mean."""
+        if self.trials < 2:
+            return math.inf
+        return z * math.sqrt(self.variance / self.trials)
+
+    def relative_half_width(self, z=1.96):
+        half_width = self.half_width(z)
+        if half_width == 0:
+            return 0.0
+        return half_width / self.mean if self.mean > 0 else math.inf
+
+class SweepScheduler:
+    """Decides which cells get the next trials.
+
+    Every cell gets at least `min_trials` and at most `max_trials` trials. In
+    between, a cell is done once the relative half width of its confidence
+    interval (at `z` standard errors) is at most `rel_tol`.
+
+    """
+    def __init__(self, cells, min_trials=10, max_trials=100, rel_tol=0.05, z=1.96, seed=0):
+        self.cells = list(cells)
+        self.stats = [CellStats() for _ in self.cells]
+        self.min_trials = min_trials
+        self.max_trials = max_trials
+        self.rel_tol = rel_tol
+        self.z = z
+        self.seed = seed
+        self.scheduled = [0] * len(self.cells)
+
+    def done(self, cell):
+        stats = self.stats[cell]
+        if stats.trials >= self.max_trials:
+            return True
+        return stats.trials >= self.min_trials and stats.relative_half_width(self.z) <= self.rel_tol
+
+    def priority(self, cell):
+        """Cells short of min_trials come first, then the widest intervals."""
+        stats = self.stats[cell]
+        return (self.scheduled[cell] < self.min_trials, stats.relative_half_width(self.z))
+
+    def next_trials(self, size):
+        """Returns up to `size` trials for the cells that aren't done, most
+        uncertain cells first. Returns [] once every cell is done."""
+        open_cells = sorted((cell for cell in range(len(self.cells)) if not self.done(cell)),
+                            key=self.priority, reverse=True)
+        trials = []
+        while open_cells and len(trials) < size:
+            for cell in list(open_cells):
+                if self.scheduled[cell] >= self.max_trials:
+                    open_cells.remove(cell)
+                    continue
+                trials.append(self.trial(cell, self.scheduled[cell]))
+                self.scheduled[cell] += 1
+                if len(trials) == size:
+                    break
+        return trials
+
+    def trial(self, cell, index):
+        return Trial(cell, index, stream_seed(self.seed, cell, index))
+
+    def record(self, trial, sentences, converged):
+        self.stats[trial.cell].add(sentences, converged)
+
+    def summary(self):
+        """Returns a list of (cell, stats) pairs."""
+        return list(zip(self.cells, self.stats))
+
+def run_trial(domain, cell, seed, sampled=False):
+    """Runs one trial of `cell`. Returns (sentences consumed, converged). If
+    `sampled`, the learner draws its hypotheses with a
+    learners.sampling.LegalGrammarSampler."""
+    sampler = LegalGrammarSampler(domain) if sampled else None
+    learner = LEARNERS_BY_NAME[cell.learner](domain, learning_rate=cell.learning_rate,
+                                             threshold=cell.threshold, rng=random.Random(seed),
+                                             sampler=sampler)
+    language = tuple(domain.language[cell.grammar])
+    sentences = learn_language(learner, language, iterations=cell.max_sentences)
+    return sentences, learner.converged()
+
+_domain = None
+_cells = None
+_sampled = False
+
+def _set_domain(domain, cells, sampled=False):
+    global _domain, _cells, _sampled
+    _domain, _cells, _sampled = domain, cells, sampled
+
+def _run_trial(trial):
+    return trial, run_trial(_domain, _cells[trial.cell], trial.seed, _sampled)
+
+def run_schedule(domain, scheduler, processes=None, round_size=None, sampled=False):
+    """Runs trials until `scheduler` has no more, `round_size` at a time (by
+    default, four per process) in a pool of `processes` worker processes
+    (by default, one per cpu; 1 runs them in this process). If `sampled`,
+    learners draw their hypotheses with a LegalGrammarSampler."""
+    round_size = round_size or 4 * (processes or multiprocessing.cpu_count())
+    if processes == 1:
+        _set_domain(domain, scheduler.cells, sampled)
+        pool = None
+        run = lambda trials: map(_run_trial, trials)
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_set_domain,
+                                    initargs=(domain, scheduler.cells, sampled))
+        run = lambda trials: pool.imap_unordered(_run_trial, trials)
+    try:
+        trials = scheduler.next_trials(round_size)
+        while trials:
+            for trial, (sentences, converged) in run(trials):
+                scheduler.record(trial, sentences, converged)
+            trials = scheduler.next_trials(round_size)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _set_domain(None, None)
+
+SUMMARY_COLUMNS = ['Type of Learner', 'Grammar ID', 'Learning Rate', 'Threshold',
+                   'Max Sentences', 'Trials', 'Converged', 'Mean Sentences',
+                   'CI Half Width']
+
+def write_summary(path, scheduler):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_COLUMNS)
+        for cell, stats in scheduler.summary():
+            writer.writerow(list(cell) + [stats.trials, stats.converged, stats.mean,
+                                          stats.half_width(scheduler.z)])
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=""" Sweep learner settings, running trials until each cell's mean is known to within a tolerance. """)
+    parser.add_argument('--output', default='sweep_summary.csv')
+    parser.add_argument('--learners', nargs='+', choices=[L.__name__ for L in LEARNERS],
+                        default=['RewardOnlyLearner'])
+    parser.add_argument('--grammars', type=int, nargs='+', default=[611])
+    parser.add_argument('--learning-rates', type=float, nargs='+', default=[.001])
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[.02])
+    parser.add_argument('--max-sentences', type=int, nargs='+', default=[5000000])
+    parser.add_argument('--min-trials', type=int, default=10)
+    parser.add_argument('--max-trials', type=int, default=100)
+    parser.add_argument('--rel-tol', type=float, default=0.05,
+                        help='stop a cell once its CI half width is this fraction of its mean')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--sampled', action='store_true',
+                        help='draw hypothesis grammars with an exact sampler instead of rejection sampling')
+    args = parser.parse_args()
+
+    cells = grid(args.learners, args.grammars, args.learning_rates, args.thresholds,
+                 args.max_sentences)
+    scheduler = SweepScheduler(cells, args.min_trials, args.max_trials, args.rel_tol,
+                               seed=args.seed)
+    run_schedule(Colag.default(), scheduler, args.processes, sampled=args.sampled)
+    write_summary(args.output, scheduler)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Distributions over the sentences of a target language.
+
+`learn_language` draws sentences uniformly with `random.choice`. A
+`SentenceDistribution` draws them with given probabilities instead, e.g.
+weighted by how often each sentence pattern occurs in CHILDES (the
+frequency file used by YangCoLAG7_dist_childes.py), or Zipfian. Draws use an
+alias table (see learners/sampling.py), so each one is constant time
+however skewed the distribution, and are made with numpy in batches of
+`batch_size`, so a frequency-weighted run costs about the same as a uniform
+one.
+
+    freqs = read_frequencies('COLAG_2011_sents_w_freq.txt')
+    english = frequency_weighted(domain.language[611], freqs)
+    learn_language(learner, english, iterations=5000000)
+
+"""
+
+import numpy as np
+
+from learners.sampling import alias_table
+
+class SentenceDistribution:
+    """Draws sentence ids from `sentences` with the given `probabilities`
+    (by default, uniformly). `self.sentences` holds the sentence ids sorted,
+    and `self.probabilities` their normalized probabilities."""
+    def __init__(self, sentences, probabilities=None, rng=None, batch_size=4096):
+        sentences = np.array(list(sentences), dtype=np.int64)
+        order = np.argsort(sentences)
+        self.sentences = sentences[order]
+        if len(self.sentences) == 0:
+            raise ValueError('cannot draw from an empty language')
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.batch_size = batch_size
+        self.prob = self.alias = None
+        if probabilities is None:
+            self.probabilities = np.full(len(self.sentences), 1 / len(self.sentences))
+        else:
+            probabilities = np.asarray(probabilities, dtype=np.float64)[order]
+            if probabilities.sum() <= 0:
+                raise ValueError('every sentence has probability 0')
+            self.probabilities = probabilities / probabilities.sum()
+            self.prob, self.alias = alias_table(self.probabilities)
+        self._buffer = []
+
+    def with_rng(self, rng):
+        """Returns a copy of this distribution that draws with `rng`."""
+        copy = object.__new__(SentenceDistribution)
+        copy.__dict__.update(self.__dict__)
+        copy.rng = rng
+        copy._buffer = []
+        return copy
+
+    def indices(self, size):
+        """Returns `size` positions in self.sentences, drawn independently."""
+        index = self.rng.integers(len(self.sentences), size=size)
+        if self.prob is None:
+            return index
+        keep = self.rng.random(size) < self.prob[index]
+        return np.where(keep, index, self.alias[index])
+
+    def draws(self, size):
+        """Returns an array of `size` sentence ids."""
+        return self.sentences[self.indices(size)]
+
+    def draw(self):
+        """Returns one sentence id."""
+        if not self._buffer:
+            self._buffer = self.draws(self.batch_size).tolist()
+        return self._buffer.pop()
+
+def uniform(language, **kwargs):
+    return SentenceDistribution(language, **kwargs)
+
+def frequency_weighted(language, frequencies, **kwargs):
+    """Draws each sentence of `language` in proportion to its count in
+    `frequencies` (a dict of sentence id -> count). Sentences without a
+    count are never drawn."""
+    sentences = sorted(language)
+    return SentenceDistribution(sentences, [frequencies.get(s, 0) for s in sentences], **kwargs)
+
+def zipfian(language, exponent=1.0, order=None, **kwargs):
+    """Draws the sentence of rank k (counting from 1) with probability
+    proportional to 1 / k ** exponent. Sentences are ranked by `order`, a
+    list of sentence ids, if given, and otherwise by sentence id."""
+    sentences = list(order) if order is not None else sorted(language)
+    if set(sentences) != set(language):
+        raise ValueError('order must rank exactly the sentences of the language')
+    ranks = np.arange(1, len(sentences) + 1, dtype=np.float64)
+    return SentenceDistribution(sentences, ranks ** -exponent, **kwargs)
+
+def read_frequencies(path):
+    """Returns {sentence id: frequency} from a sentence frequency file, with
+    four tab-separated columns: sentence id, illocutionary force, sentence
+    pattern and frequency."""
+    frequencies = {}
+    with open(path) as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            sid, _, _, freq = line.rstrip('\n').split('\t')
+            frequencies[int(sid)] = int(freq)
+    return frequencies
@@ -0,0 +1,239 @@
+"""
+Summaries of simulation results, computed as the results come in.
+
+The notebooks read every results row back into pandas to get convergence
+rates, mean sentences consumed and Hamming distances to the target. A
+`SweepSummary` keeps those statistics up to date one row at a time, for each
+(irrelevance variant, learner, target grammar), in memory that doesn't grow
+with the number of trials:
+
+- the number of trials, and how many converged (every weight within the
+  learner's threshold at the end);
+- the mean and variance of the sentences consumed (`RunningStats`, Welford's
+  method), and approximate quantiles of it (`QuantileSketch`);
+- a histogram of the Hamming distance between hypothesis and target;
+- for each parameter, how many trials converged on it and the mean number of
+  sentences it took;
+- with an outcome classifier (colag/outcomes.py), the count of each outcome.
+
+Summaries of different parts of a sweep can be merged.
+
+    summary = SweepSummary()
+    for row in run_vl_on_languages(RewardOnlyLearner, [611], 100, 500000,
+                                   summary=summary, variant='normal'):
+        ...
+    summary.write('summary.csv')
+
+"""
+
+import csv
+import math
+from collections import Counter
+
+import numpy as np
+
+from colag.colag import parameters
+from colag.outcomes import OUTCOMES
+
+class RunningStats:
+    """The running count, mean and variance of a stream of numbers."""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Adds the values summarized by `other` (Chan et al.'s method)."""
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+class QuantileSketch:
+    """Approximate quantiles of a stream of non-negative numbers.
+
+    Values are counted in buckets whose bounds grow by a factor of
+    (1 + relative_accuracy) / (1 - relative_accuracy), so a quantile is
+    within `relative_accuracy` of the true value, and a stream spanning a
+    range of values from 1 to n needs O(log n / relative_accuracy) buckets.
+    Quantiles are clamped to the smallest and largest values seen.
+
+    """
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = Counter()
+        self.zeros = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        if value < 0:
+            raise ValueError('QuantileSketch only counts non-negative values')
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value == 0:
+            self.zeros += 1
+        else:
+            self.buckets[math.ceil(math.log(value) / self.log_gamma)] += 1
+        self.count += 1
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError('cannot merge sketches with different accuracies')
+        self.buckets.update(other.buckets)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Returns the approximate `q` quantile (0 <= q <= 1), or nan if no
+        values have been added."""
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                break
+        value = 2 * self.gamma ** key / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+def hamming_distance(g1, g2):
+    return bin(g1 ^ g2).count('1')
+
+class TrialSummary:
+    """The statistics of the trials of one (variant, learner, grammar)."""
+    def __init__(self, num_params=13, relative_accuracy=0.01):
+        self.trials = 0
+        self.converged = 0
+        self.sentences = RunningStats()
+        self.sentence_quantiles = QuantileSketch(relative_accuracy)
+        self.hamming = np.zeros(num_params + 1, dtype=np.int64)
+        self.param_converged = np.zeros(num_params, dtype=np.int64)
+        self.converged_at = [RunningStats() for _ in range(num_params)]
+        self.outcomes = np.zeros(len(OUTCOMES), dtype=np.int64)
+
+    def add(self, target, sentences, hypothesis, converged_at=None, outcome=None):
+        """Adds one trial. `converged_at` holds the number of sentences after
+        which each parameter's weight converged, or -1 (see
+        VariationalLearner.converged_at); trials without it (rows from older
+        CSVs) don't count towards the convergence statistics."""
+        self.trials += 1
+        self.sentences.add(sentences)
+        self.sentence_quantiles.add(sentences)
+        self.hamming[hamming_distance(target, hypothesis)] += 1
+        if converged_at is not None:
+            converged_at = list(converged_at)
+            self.converged += all(c >= 0 for c in converged_at)
+            for param, at in enumerate(converged_at):
+                if at >= 0:
+                    self.param_converged[param] += 1
+                    self.converged_at[param].add(at)
+        if outcome is not None:
+            self.outcomes[outcome] += 1
+
+    def merge(self, other):
+        self.trials += other.trials
+        self.converged += other.converged
+        self.sentences.merge(other.sentences)
+        self.sentence_quantiles.merge(other.sentence_quantiles)
+        self.hamming += other.hamming
+        self.param_converged += other.param_converged
+        for mine, theirs in zip(self.converged_at, other.converged_at):
+            mine.merge(theirs)
+        self.outcomes += other.outcomes
+
+    @property
+    def mean_hamming(self):
+        if self.trials == 0:
+            return math.nan
+        return float(np.arange(len(self.hamming)) @ self.hamming / self.trials)
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+SUMMARY_COLUMNS = (['Variant', 'Type of Learner', 'Grammar ID', 'Trials', 'Converged',
+                    'Mean Sentences', 'Sentences SD']
+                   + ['Sentences p{:g}'.format(100 * q) for q in QUANTILES]
+                   + ['Mean Hamming Distance']
+                   + ['{} Converged'.format(p) for p in parameters]
+                   + ['{} Mean Converged At'.format(p) for p in parameters]
+                   + ['Outcome {}'.format(name) for name in OUTCOMES])
+
+class SweepSummary:
+    """A `TrialSummary` for each (variant, learner, grammar) that results
+    have been added for. With an OutcomeClassifier (see
+    colag/outcomes.py), each trial's outcome is counted too."""
+    def __init__(self, classifier=None, num_params=13, relative_accuracy=0.01):
+        self.classifier = classifier
+        self.num_params = num_params
+        self.relative_accuracy = relative_accuracy
+        self.groups = {}
+
+    def group(self, variant, learner, grammar):
+        key = (variant, learner, grammar)
+        if key not in self.groups:
+            self.groups[key] = TrialSummary(self.num_params, self.relative_accuracy)
+        return self.groups[key]
+
+    def add(self, variant, learner, grammar, sentences, hypothesis, converged_at=None):
+        outcome = None
+        if self.classifier is not None:
+            outcome = int(self.classifier.classify(grammar, hypothesis))
+        self.group(variant, learner, grammar).add(grammar, sentences, hypothesis,
+                                                  converged_at, outcome)
+
+    def add_row(self, row, variant=None):
+        """Adds a results row in the RESULT_COLUMNS layout (as values, or as
+        strings read back from a CSV)."""
+        converged_at = [int(c) for c in row[20:20 + self.num_params]] or None
+        self.add(variant, row[0], int(row[1]), int(row[3]), int(row[4]), converged_at)
+
+    def merge(self, other):
+        for key, group in other.groups.items():
+            self.group(*key).merge(group)
+
+    def rows(self):
+        """Returns a row in the SUMMARY_COLUMNS layout for each group, sorted
+        by key."""
+        rows = []
+        for key in sorted(self.groups, key=lambda key: tuple(str(k) for k in key)):
+            group = self.groups[key]
+            row = list(key) + [group.trials, group.converged,
+                               group.sentences.mean, group.sentences.std]
+            row += [group.sentence_quantiles.quantile(q) for q in QUANTILES]
+            row += [group.mean_hamming]
+            row += group.param_converged.tolist()
+            row += [stats.mean if stats.count else '' for stats in group.converged_at]
+            row += group.outcomes.tolist() if self.classifier is not None else [''] * len(OUTCOMES)
+            rows.append(row)
+        return rows
+
+    def write(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(SUMMARY_COLUMNS)
+            writer.writerows(self.rows())
@@ -0,0 +1,356 @@
+"""
+Runs the `run_sim` simulations in parallel.
+
+`variational.main` runs every (irrelevance variant, learner, grammar, trial)
+combination one after another in a single process. Here each combination is
+a `Task`, and tasks are spread across a process pool. The domains are loaded
+once, before the pool starts, so forked workers share them copy-on-write.
+
+Every task has its own seed, derived from the sweep's seed and the task's
+position in the sweep (not from the order tasks happen to be run in), so a
+sweep gives the same results with any number of processes. Results come back
+in task order and are written by the parent process to a single CSV with the
+same columns as `run_sim`.
+
+A sweep given a checkpoint directory can be restarted after a crash. The
+directory holds:
+
+- manifest.json: the sweep settings and the key of every task (variant,
+  irrelevance file, learner, grammar, trial and seed). A restarted sweep must
+  have the same manifest.
+- completed.csv: the results row of each finished task, prefixed with its
+  variant, appended and flushed as tasks finish.
+- state/: for each running trial, the learner's weights and convergence
+  times, sentence counter, elapsed time and random state (and, for sampled
+  sweeps, the weights its grammar sampler was last built from), saved every
+  `checkpoint_every` sentences.
+
+Restarting skips the completed tasks and resumes running trials from their
+last saved state, drawing the same sentences and grammars they would have
+without the restart. Once every task is done, the results are written to the
+output CSV in task order.
+
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import pickle
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from colag.colag import Colag, COLAG_TSV, COMPILED_DOMAIN
+from colag.relevance import OUTPUT_FILES, VARIANTS
+from colag.streams import stream_seed
+from learners.results import ResultsWriter
+from learners.sampling import LegalGrammarSampler
+from learners.summaries import SweepSummary
+from learners.variational import (RESULT_COLUMNS, PunishOnlyLearner,
+                                  RewardOnlyLearner, RewardOnlyRelevantLearner,
+                                  SkepticalRewardOnlyLearner, learn_language)
+
+LEARNERS = [RewardOnlyLearner,
+            RewardOnlyRelevantLearner,
+            SkepticalRewardOnlyLearner,
+            PunishOnlyLearner]
+
+LEARNERS_BY_NAME = {Learner.__name__: Learner for Learner in LEARNERS}
+
+# the grammars and sizes run_sim uses
+GRAMMARS = [611, 3856, 2253, 584]
+NUM_TRIALS = 100
+NUM_SENTENCES = 5000000
+
+Task = namedtuple('Task', ['variant', 'learner', 'grammar', 'trial', 'seed'])
+
+MANIFEST_VERSION = 1
+
+def task_seed(seed, variant, learner, grammar, trial):
+    """Returns the seed of one task of a sweep seeded with `seed`."""
+    return stream_seed(seed, VARIANTS.index(variant), LEARNERS.index(LEARNERS_BY_NAME[learner]),
+                       grammar, trial)
+
+def run_sim_learners(variant):
+    """Returns the names of the learners run_sim runs on `variant`."""
+    learners = [RewardOnlyRelevantLearner]
+    if variant == 'normal':
+        learners.append(RewardOnlyLearner)
+    return [Learner.__name__ for Learner in learners]
+
+def sweep_tasks(variants=VARIANTS, learners=None, grammars=GRAMMARS,
+                num_trials=NUM_TRIALS, seed=0):
+    """Returns the tasks of a sweep, in the order run_sim runs them. If
+    `learners` is None, each variant uses run_sim's learners."""
+    tasks = []
+    for variant in variants:
+        for learner in learners or run_sim_learners(variant):
+            for grammar in grammars:
+                for trial in range(num_trials):
+                    tasks.append(Task(variant, learner, grammar, trial,
+                                      task_seed(seed, variant, learner, grammar, trial)))
+    return tasks
+
+def load_domains(variants, data_dir='./data'):
+    """Returns {variant: Colag} for each irrelevance variant."""
+    return {variant: Colag.from_tsvs(COLAG_TSV, os.path.join(data_dir, OUTPUT_FILES[variant]),
+                                     compiled_dir=COMPILED_DOMAIN)
+            for variant in variants}
+
+def task_key(task):
+    """Returns the string identifying `task` in a checkpoint directory."""
+    return '{}-{}-{}-{}'.format(task.variant, task.learner, task.grammar, task.trial)
+
+def read_state(path):
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def write_state(path, state):
+    """Replaces the trial state at `path` without leaving a partial file if
+    interrupted."""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(tmp, path)
+
+def run_task(domain, task, num_sentences, state_path=None, checkpoint_every=100000,
+             sampled=False):
+    """Runs one trial and returns its results row (see RESULT_COLUMNS).
+
+    If `state_path` is given, the trial's state is saved there every
+    `checkpoint_every` sentences, and resumed from it if it already exists.
+    The file is removed once the trial is done. If `sampled`, the learner
+    draws its hypotheses with a learners.sampling.LegalGrammarSampler.
+    """
+    sampler = LegalGrammarSampler(domain) if sampled else None
+    learner = LEARNERS_BY_NAME[task.learner](domain, rng=random.Random(task.seed),
+                                             sampler=sampler)
+    language = tuple(domain.language[task.grammar])
+    state = read_state(state_path)
+    if state is None:
+        counter, elapsed = 0, timedelta()
+    else:
+        learner.rng.setstate(state['random'])
+        learner.sentences_consumed = state['sentences_consumed']
+        learner.weights = state['weights']
+        learner.converged_at = state['converged_at']
+        counter, elapsed = state['counter'], state['elapsed']
+        if state.get('sampler') is not None:
+            sampler.rebuild(state['sampler'])
+
+    start = datetime.now()
+    checkpoint = None
+    if state_path is not None:
+        def checkpoint(counter):
+            write_state(state_path, {'weights': learner.weights,
+                                     'sentences_consumed': learner.sentences_consumed,
+                                     'converged_at': learner.converged_at,
+                                     'counter': counter,
+                                     'elapsed': elapsed + (datetime.now() - start),
+                                     'random': learner.rng.getstate(),
+                                     'sampler': sampler and sampler.table_weights})
+    sentences_consumed = learn_language(learner, language, iterations=num_sentences,
+                                        counter=counter, checkpoint=checkpoint,
+                                        checkpoint_every=checkpoint_every)
+    runtime = elapsed + (datetime.now() - start)
+
+    result = [task.learner,
+              task.grammar,
+              task.trial,
+              sentences_consumed,
+              learner.choose_grammar()]
+    result += learner.weights
+    result += [task.seed, runtime]
+    result += learner.converged_at
+    if state_path is not None and os.path.exists(state_path):
+        os.remove(state_path)
+    return result
+
+_domains = None
+_num_sentences = None
+_state_dir = None
+_checkpoint_every = None
+_sampled = False
+
+def _set_domains(domains, num_sentences, state_dir=None, checkpoint_every=None,
+                 sampled=False):
+    global _domains, _num_sentences, _state_dir, _checkpoint_every, _sampled
+    _domains, _num_sentences = domains, num_sentences
+    _state_dir, _checkpoint_every, _sampled = state_dir, checkpoint_every, sampled
+
+def _run_task(task):
+    if _state_dir is None:
+        return run_task(_domains[task.variant], task, _num_sentences, sampled=_sampled)
+    state_path = os.path.join(_state_dir, task_key(task) + '.pkl')
+    return task, run_task(_domains[task.variant], task, _num_sentences,
+                          state_path, _checkpoint_every, _sampled)
+
+def run_tasks(domains, tasks, num_sentences=NUM_SENTENCES, processes=None,
+              state_dir=None, checkpoint_every=100000, sampled=False):
+    """Yields the results row of each task in `tasks`, in order, running them
+    in a pool of `processes` worker processes (by default, one per cpu; 1
+    runs them in this process).
+
+    If `state_dir` is given, trials checkpoint their state there (see
+    run_task), and (task, row) pairs are yielded in the order tasks finish.
+
+    """
+    initargs = (domains, num_sentences, state_dir, checkpoint_every, sampled)
+    if processes == 1:
+        _set_domains(*initargs)
+        try:
+            yield from map(_run_task, tasks)
+        finally:
+            _set_domains(None, None)
+        return
+    with multiprocessing.Pool(processes, initializer=_set_domains,
+                              initargs=initargs) as pool:
+        if state_dir is None:
+            yield from pool.imap(_run_task, tasks)
+        else:
+            yield from pool.imap_unordered(_run_task, tasks)
+
+def sweep_manifest(tasks, num_sentences, sampled=False):
+    manifest = {'version': MANIFEST_VERSION,
+                'num_sentences': num_sentences,
+                'tasks': [{'variant': task.variant,
+                           'irrelevance': OUTPUT_FILES[task.variant],
+                           'learner': task.learner,
+                           'grammar': task.grammar,
+                           'trial': task.trial,
+                           'seed': task.seed}
+                          for task in tasks]}
+    if sampled:
+        manifest['sampled'] = True
+    return manifest
+
+def check_manifest(checkpoint_dir, manifest):
+    """Writes `manifest` to a new checkpoint directory, or checks that it
+    matches the manifest of an existing one."""
+    path = os.path.join(checkpoint_dir, 'manifest.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            if json.load(f) != manifest:
+                raise ValueError('{} belongs to a different sweep'.format(checkpoint_dir))
+        return
+    os.makedirs(os.path.join(checkpoint_dir, 'state'), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+def read_completed(path):
+    """Returns {task key: results row} from the completed.csv at `path`. A
+    partial last line, left by a crash mid-write, is truncated away."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='') as f:
+        text = f.read()
+    if not text.endswith('\n'):
+        text = text[:text.rfind('\n') + 1]
+        with open(path, 'w', newline='') as f:
+            f.write(text)
+    completed = {}
+    for row in csv.reader(text.splitlines()):
+        variant, learner, grammar, trial = row[:4]
+        completed['{}-{}-{}-{}'.format(variant, learner, grammar, trial)] = row[1:]
+    return completed
+
+def summarized(summary, tasks, rows):
+    """Yields `rows`, the results rows of `tasks`, adding each one to
+    `summary` as it comes."""
+    for task, row in zip(tasks, rows):
+        if summary is not None:
+            summary.add_row(row, task.variant)
+        yield row
+
+def run_sweep(domains, tasks, output, num_sentences=NUM_SENTENCES, processes=None,
+              checkpoint_dir=None, checkpoint_every=100000, output_format='csv',
+              summary=None, sampled=False):
+    """Runs `tasks` and writes their results to `output`, a CSV or (with
+    `output_format` 'store') a results store (see learners/results.py). With
+    a `checkpoint_dir`, the sweep can be restarted after a crash (see the
+    module docstring). If given, every task's results row is added to
+    `summary`, a learners.summaries.SweepSummary. If `sampled`, learners
+    draw their hypotheses with a learners.sampling.LegalGrammarSampler."""
+    write = write_results if output_format == 'csv' else write_store
+    if checkpoint_dir is None:
+        write(output, summarized(summary, tasks,
+                                 run_tasks(domains, tasks, num_sentences, processes,
+                                           sampled=sampled)))
+        return
+
+    check_manifest(checkpoint_dir, sweep_manifest(tasks, num_sentences, sampled))
+    completed_path = os.path.join(checkpoint_dir, 'completed.csv')
+    completed = read_completed(completed_path)
+    pending = [task for task in tasks if task_key(task) not in completed]
+    if summary is not None:
+        for task in tasks:
+            if task_key(task) in completed:
+                summary.add_row(completed[task_key(task)], task.variant)
+    with open(completed_path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        for task, result in run_tasks(domains, pending, num_sentences, processes,
+                                      os.path.join(checkpoint_dir, 'state'),
+                                      checkpoint_every, sampled):
+            writer.writerow([task.variant] + result)
+            f.flush()
+            os.fsync(f.fileno())
+            if summary is not None:
+                summary.add_row(result, task.variant)
+    completed = read_completed(completed_path)
+    write(output, (completed[task_key(task)] for task in tasks))
+
+def write_results(path, results):
+    """Writes the rows in `results` to the CSV at `path`, with a header."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(RESULT_COLUMNS)
+        for result in results:
+            writer.writerow(result)
+
+def write_store(path, results):
+    """Adds the rows in `results` to the results store at `path`."""
+    with ResultsWriter(path) as writer:
+        writer.extend(results)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=""" Run the run_sim learner simulations across a process pool. """)
+    parser.add_argument('--output', default='learner_results.csv')
+    parser.add_argument('--format', choices=['csv', 'store'], default='csv',
+                        help='write a CSV, or a columnar results store directory')
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=VARIANTS)
+    parser.add_argument('--learners', nargs='+', choices=list(LEARNERS_BY_NAME), default=None,
+                        help="learners to run on every variant (default: run_sim's)")
+    parser.add_argument('--grammars', type=int, nargs='+', default=GRAMMARS)
+    parser.add_argument('--trials', type=int, default=NUM_TRIALS)
+    parser.add_argument('--sentences', type=int, default=NUM_SENTENCES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (default: one per cpu)')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='directory to checkpoint the sweep in, so it can be restarted')
+    parser.add_argument('--checkpoint-every', type=int, default=100000,
+                        help='sentences between checkpoints of a running trial')
+    parser.add_argument('--sampled', action='store_true',
+                        help='draw hypothesis grammars with an exact sampler instead of rejection sampling')
+    parser.add_argument('--summary', default=None,
+                        help='also write summary statistics of each learner and grammar to this CSV')
+    args = parser.parse_args()
+
+    then = datetime.now()
+    domains = load_domains(args.variants)
+    tasks = sweep_tasks(args.variants, args.learners, args.grammars, args.trials, args.seed)
+    summary = SweepSummary() if args.summary else None
+    run_sweep(domains, tasks, args.output, args.sentences, args.processes,
+              args.checkpoint_dir, args.checkpoint_every, args.format, summary,
+              args.sampled)
+    if summary is not None:
+        summary.write(args.summary)
+    print((datetime.now() - then).total_seconds())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Recording the path a variational learner's weights take while it learns.
+
+`simulation.HistoryReporter` used to print every learner's weights every 20
+sentences, which took most of the runtime and produced gigabytes of text.
+The `Recording` mixin instead copies the weights into a preallocated float32
+array, at the steps chosen by a sampling policy:
+
+- Stride(n): every n sentences.
+- LogSpaced(per_decade): about `per_decade` samples between each power of
+  ten, so early learning is seen in detail and long runs stay small.
+- OnChange(epsilon): whenever some weight has moved more than `epsilon`
+  since the last sample.
+
+Each trajectory is saved to its own .npz file, holding a `steps` array (the
+number of sentences consumed at each sample) and a (samples x 13) `weights`
+array, and is read back with `read_trajectory`.
+
+"""
+
+import glob
+import math
+import os
+
+import numpy as np
+
+class Stride:
+    """Samples every `stride` sentences."""
+    def __init__(self, stride=20):
+        self.stride = stride
+
+    def due(self, step, weights, last):
+        return step % self.stride == 0
+
+class LogSpaced:
+    """Samples about `per_decade` times between consecutive powers of ten."""
+    def __init__(self, per_decade=20):
+        self.per_decade = per_decade
+
+    def due(self, step, weights, last):
+        if step <= 1:
+            return True
+        return (math.floor(self.per_decade * math.log10(step))
+                != math.floor(self.per_decade * math.log10(step - 1)))
+
+class OnChange:
+    """Samples when some weight differs from the last sample by more than
+    `epsilon`."""
+    def __init__(self, epsilon=0.01):
+        self.epsilon = epsilon
+
+    def due(self, step, weights, last):
+        if last is None:
+            return True
+        return any(abs(w - l) > self.epsilon for w, l in zip(weights, last))
+
+class Trajectory:
+    """A growable buffer of (step, weights) samples."""
+    def __init__(self, num_params=13, capacity=1024):
+        self._steps = np.empty(capacity, dtype=np.int64)
+        self._weights = np.empty((capacity, num_params), dtype=np.float32)
+        self.size = 0
+
+    def append(self, step, weights):
+        if self.size == len(self._steps):
+            self._steps = np.resize(self._steps, 2 * self.size)
+            self._weights = np.resize(self._weights, (2 * self.size, self._weights.shape[1]))
+        self._steps[self.size] = step
+        self._weights[self.size] = weights
+        self.size += 1
+
+    @property
+    def steps(self):
+        return self._steps[:self.size]
+
+    @property
+    def weights(self):
+        return self._weights[:self.size]
+
+    def last(self):
+        """Returns the most recently sampled weights, or None."""
+        return self._weights[self.size - 1] if self.size else None
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, steps=self.steps, weights=self.weights)
+
+def read_trajectory(path):
+    """Returns the (steps, weights) arrays saved at `path`."""
+    with np.load(path) as data:
+        return data['steps'], data['weights']
+
+def read_trajectories(directory):
+    """Returns {file name without extension: (steps, weights)} for every
+    trajectory saved in `directory`."""
+    return {os.path.splitext(os.path.basename(path))[0]: read_trajectory(path)
+            for path in sorted(glob.glob(os.path.join(directory, '*.npz')))}
+
+class Recording:
+    """A mixin for a VL which records its weights into `self.trajectory` as
+    it consumes sentences, at the steps chosen by `policy` (by default, every
+    20 sentences)."""
+    def __init__(self, *args, policy=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.policy = policy or Stride()
+        self.trajectory = Trajectory(len(self.weights))
+        self.trajectory.append(0, self.weights)
+
+    def consume(self, *args, **kwargs):
+        val = super().consume(*args, **kwargs)
+        if self.policy.due(self.sentences_consumed, self.weights, self.trajectory.last()):
+            self.trajectory.append(self.sentences_consumed, self.weights)
+        return val
@@ -29,7 +29,11 @@ import sys
 print(sys.path)
 import csv
 
-from colag.colag import Colag, get_param_value, toggled
+from colag.colag import Colag, parameters
+from colag.masks import GRAMMAR_BITS, param_updates
+from colag.streams import numpy_stream, stream_seed
+from learners.sampling import LegalGrammarSampler
+from learners.sentences import SentenceDistribution
 from datetime import datetime
 
 def param_list_to_grammar(params):
@@ -41,18 +45,23 @@ def param_list_to_grammar(params):
         grammar += value * (2 ** (total_bits - bit - 1))
     return grammar
 
-def weighted_coin_flip(weight):
+def weighted_coin_flip(weight, rng=random):
     " Returns 1 with a probability of `weight`, otherwise 0. "
-    return int(random.random() < weight)
+    return int(rng.random() < weight)
 
 class VariationalLearner:
     """An abstract base class for a variational learner.
 
     To create a usable variational learner, make a class that subclasses this
     one and defines `reward` and `punish` methods which update the parameter
-    weights.
+    weights with `move_weight`.
+
+    The learner keeps track of which weights are within `threshold` of 0 or
+    1 as they are updated: `unconverged` is the number of weights that
+    aren't, and `converged_at[i]` is the number of sentences consumed when
+    weight i last came within the threshold (-1 if it isn't).
     """
-    def __init__(self, domain, learning_rate=.001):
+    def __init__(self, domain, learning_rate=.001, sampler=None, threshold=0.02, rng=None):
         """Args:
 
         - domain: an object representing the Colag domain. it should
@@ -65,28 +74,132 @@ class VariationalLearner:
              integer to a set of sentence ids- the sentences generated by that
              grammar.
 
+          3. a .parses method, which accepts a grammar id and a sentence id
+             and returns true if the sentence is in that grammar's language.
+
         - learning_rate: a float that controls how much the weights are updated
         with every sentence.
 
+        - sampler: optionally, a learners.sampling.LegalGrammarSampler for
+        the domain. If given, hypothesis grammars are drawn from it instead
+        of by rejection sampling.
+
+        - threshold: how close to 0 or 1 a weight must be to count as
+        converged.
+
+        - rng: the random.Random to choose grammars with (and, in
+        learn_language, sentences), e.g. from colag.streams.python_stream.
+        By default, the random module's global generator.
+
     """
 
         self.domain = domain
         self.learning_rate = learning_rate
+        self.sampler = sampler
+        self.threshold = threshold
+        self.rng = rng if rng is not None else random
+        self.sentences_consumed = 0
         self.weights = [0.5] * domain.num_params
 
+    @property
+    def weights(self):
+        return self._weights
+
+    @weights.setter
+    def weights(self, weights):
+        self._weights = list(weights)
+        self._settled = [self.settled(w) for w in self._weights]
+        self.unconverged = self._settled.count(False)
+        self.converged_at = [self.sentences_consumed if settled else -1
+                             for settled in self._settled]
+
+    def settled(self, weight):
+        return weight <= self.threshold or weight >= 1 - self.threshold
+
+    def move_weight(self, index, value, learning_rate):
+        """Nudges weight `index` towards `value` (0 or 1) by `learning_rate`."""
+        weight = self._weights[index]
+        if value == 0:
+            weight -= learning_rate * weight
+        elif value == 1:
+            weight += learning_rate * (1 - weight)
+        self._weights[index] = weight
+        settled = weight <= self.threshold or weight >= 1 - self.threshold
+        if settled != self._settled[index]:
+            self._settled[index] = settled
+            if settled:
+                self.unconverged -= 1
+                self.converged_at[index] = self.sentences_consumed
+            else:
+                self.unconverged += 1
+                self.converged_at[index] = -1
+
+    def move_weights(self, values, updates, learning_rate):
+        """Nudges each weight in `updates`, a sequence of (index, multiplier)
+        pairs, towards values[index] (0 or 1) by learning_rate * multiplier,
+        as `move_weight` would, in one pass."""
+        weights, settled_flags = self._weights, self._settled
+        lower, upper = self.threshold, 1 - self.threshold
+        for index, multiplier in updates:
+            weight = weights[index]
+            weight += learning_rate * multiplier * (values[index] - weight)
+            weights[index] = weight
+            settled = weight <= lower or weight >= upper
+            if settled != settled_flags[index]:
+                settled_flags[index] = settled
+                if settled:
+                    self.unconverged -= 1
+                    self.converged_at[index] = self.sentences_consumed
+                else:
+                    self.unconverged += 1
+                    self.converged_at[index] = -1
+
     def consume(self, sentence):
         """ Update the parameter weights based on the knowledge that `sentence`
         (an integer sentence id) exists in the target language.
         """
+        self.sentences_consumed += 1
         hypothesis_grammar = self.choose_grammar()
         if self.parses(hypothesis_grammar, sentence):
             self.reward(hypothesis_grammar, sentence)
         else:
             self.punish(hypothesis_grammar, sentence)
 
+    def consume_many(self, sentences):
+        """Consumes each of `sentences` in turn, as `consume` would, stopping
+        as soon as the weights have converged. Returns the number of
+        sentences consumed.
+
+        This avoids most of the per-sentence method lookups of calling
+        `consume` in a loop. Subclasses that override `consume` still get it
+        called for every sentence.
+        """
+        consumed = 0
+        if type(self).consume is not VariationalLearner.consume:
+            for sentence in sentences:
+                self.consume(sentence)
+                consumed += 1
+                if self.unconverged == 0:
+                    break
+            return consumed
+
+        choose_grammar, parses = self.choose_grammar, self.parses
+        reward, punish = self.reward, self.punish
+        for sentence in sentences:
+            self.sentences_consumed += 1
+            hypothesis_grammar = choose_grammar()
+            if parses(hypothesis_grammar, sentence):
+                reward(hypothesis_grammar, sentence)
+            else:
+                punish(hypothesis_grammar, sentence)
+            consumed += 1
+            if self.unconverged == 0:
+                break
+        return consumed
+
     def parses(self, grammar, sentence):
         """ Returns True if `sentence` parses in `grammar`. """
-        return sentence in self.domain.language[grammar]
+        return self.domain.parses(grammar, sentence)
 
     def choose_grammar(self):
         """Returns a random grammar valid in the language domain.
@@ -95,19 +208,23 @@ class VariationalLearner:
         corresponding weight in self.weights. If self.weights[0] is 0.2,
         then parameter 1 has a 20% chance of being set to 1.
         """
+        if self.sampler is not None:
+            return self.sampler.sample(self._weights, self.rng)
+        legal_grammar, rand = self.domain.legal_grammar, self.rng.random
         grammar = None
-        while not self.domain.legal_grammar(grammar):
+        while not legal_grammar(grammar):
             grammar = 0
-            for index, w in enumerate(self.weights):
-                if random.random() < w:
-                    grammar = toggled(12 - index, grammar) # toggle the bit in
-                                                           # the grammar int
+            for index, w in enumerate(self._weights):
+                if rand() < w:
+                    grammar |= 1 << (12 - index) # set the bit in the grammar int
         return grammar
 
-    def converged(self, threshold):
+    def converged(self, threshold=None):
         """Returns true if all values in `weights` list are less than
         `threshold` away from 0 or 1.
         """
+        if threshold is None or threshold == self.threshold:
+            return self.unconverged == 0
         for w in self.weights:
             if (w > threshold) and (w < 1 - threshold):
                 return False
@@ -130,61 +247,54 @@ class VariationalLearner:
 
 class RewardOnlyLearner(VariationalLearner):
     """ Variational learner that only updates weights if sentence parses in grammar. """
+    # learning rate multipliers by irrelevance string character (see
+    # colag/masks.py and learners/batch.py)
+    rates = {'0': 1, '1': 1, '*': 1, '~': 1}
+    updates = param_updates(2 ** 13 - 1, 0, rates)
+
     def reward(self, hypothesis_grammar, sentence):
-        for index in range(13):
-            val = get_param_value(12-index, hypothesis_grammar)
-            weight = self.weights[index]
-            if val == 0:
-                self.weights[index] -= self.learning_rate * weight
-            elif val == 1:
-                self.weights[index] += self.learning_rate * (1-weight)
+        self.move_weights(GRAMMAR_BITS[hypothesis_grammar], self.updates, self.learning_rate)
 
     def punish(*args):
         pass
 
-class RewardOnlyRelevantLearner(VariationalLearner):
+class RelevanceMasksMixin:
+    """Precomputes, in a list indexed by sentence id, the (index,
+    multiplier) pairs of the parameters the learner's `rates` update for
+    each sentence, from its relevant and ambiguous masks (see
+    colag/masks.py)."""
+    def __init__(self, domain, *args, **kwargs):
+        super().__init__(domain, *args, **kwargs)
+        self.updates = domain.update_table(self.rates)
+
+class RewardOnlyRelevantLearner(RelevanceMasksMixin, VariationalLearner):
     """Reward-only learner that ignores irrelevant parameter evidence.
     """
+    rates = {'0': 1, '1': 1, '*': 1, '~': 0}
+
     def reward(self, hypothesis_grammar, sentence):
         """ If `sentence` is known to be irrelevant to the parameter setting of Pi, do
         not update the weights for Pi. The other parameters might still be updated.
         The irrelevance is a per-sentence/per-parameter consideration.
         """
-
-        trigger_str = self.domain.sentence_irr[sentence]
-        for index in range(13):
-            if trigger_str[index] == '~':
-                continue
-            val = get_param_value(12-index, hypothesis_grammar)
-            weight = self.weights[index]
-            if val == 0:
-                self.weights[index] -= self.learning_rate * weight
-            elif val == 1:
-                self.weights[index] += self.learning_rate * (1-weight)
+        self.move_weights(GRAMMAR_BITS[hypothesis_grammar], self.updates[sentence],
+                          self.learning_rate)
 
     def punish(*args):
         pass
 
-class SkepticalRewardOnlyLearner(VariationalLearner):
+class SkepticalRewardOnlyLearner(RelevanceMasksMixin, VariationalLearner):
     """A Reward-only-relevant learner that uses knowledge of ambiguity
     to temper weight adjustments.
     """
+    rates = {'0': 1, '1': 1, '*': 0.5, '~': 0}
+
     def reward(self, hypothesis_grammar, sentence):
         """ If `sentence` is known to be ambiguous evidence wrt Pi, be
-        conservative in adjusting Pi. """
-        trigger_str = self.domain.sentence_irr[sentence]
-        for index in range(13):
-            if trigger_str[index] == '~':
-                continue
-            learning_rate = self.learning_rate
-            if trigger_str[index] == '*':
-                learning_rate = learning_rate / 2
-            val = get_param_value(12-index, hypothesis_grammar)
-            weight = self.weights[index]
-            if val == 0:
-                self.weights[index] -= learning_rate * weight
-            elif val == 1:
-                self.weights[index] += learning_rate * (1-weight)
+        conservative in adjusting Pi: its weight moves at half the learning
+        rate. """
+        self.move_weights(GRAMMAR_BITS[hypothesis_grammar], self.updates[sentence],
+                          self.learning_rate)
 
     def punish(*args):
         pass
@@ -200,32 +310,83 @@ class PunishOnlyLearner(RewardOnlyLearner):
 
 #### Simulation Code - this is temporary and should be refactored
 
-def choose_sentence(language):
-    return random.choice(language)
-
-def learn_language(learner, target_language, iterations):
-    weights = [0.5] * 13
-    threshold = 0.02
-    counter = 0
-
-    while not learner.converged(threshold):
-        sentence = choose_sentence(target_language)
-        learner.consume(sentence)
-        if counter >= iterations:
-            break
-        counter += 1
-
+def choose_sentence(language, rng=random):
+    """Returns a sentence drawn from `language`: a SentenceDistribution, or a
+    sequence of sentence ids to choose from uniformly with `rng`."""
+    if isinstance(language, SentenceDistribution):
+        return language.draw()
+    return rng.choice(language)
+
+def learn_language(learner, target_language, iterations, counter=0,
+                   checkpoint=None, checkpoint_every=100000, block_size=1024):
+    """Has `learner` consume sentences from `target_language` until it
+    converges or `iterations` sentences have been consumed.
+
+    To resume a trial, pass the learner (with its weights restored) and the
+    `counter` it had reached. If `checkpoint` is given, it is called with the
+    counter every `checkpoint_every` sentences.
+
+    Sentences are consumed `block_size` at a time with `consume_many`. If
+    `target_language` is a SentenceDistribution, each block is drawn at once
+    from its own numpy generator. Otherwise each sentence is chosen with the
+    learner's rng just before it is consumed, so the sentence and grammar
+    choices interleave exactly as they would consuming one at a time.
+    """
+    if isinstance(target_language, SentenceDistribution):
+        draws = target_language.draws
+    else:
+        choice = learner.rng.choice
+        def draws(size):
+            return (choice(target_language) for _ in range(size))
+
+    while not learner.converged():
+        size = min(block_size, iterations + 1 - counter)
+        if checkpoint is not None:
+            size = min(size, checkpoint_every - counter % checkpoint_every)
+        consumed = learner.consume_many(draws(size))
+        if counter + consumed > iterations:
+            # the last sentence was the one consumed at the limit
+            return iterations
+        counter += consumed
+        if checkpoint is not None and counter % checkpoint_every == 0:
+            checkpoint(counter)
     return counter
 
 def weights_to_params(weights):
     return ''.join(str(round(x)) for x in weights)
 
-def run_vl_on_languages(Learner, grammar_ids, num_learners, num_sentences, domain=None):
+def run_vl_on_languages(Learner, grammar_ids, num_learners, num_sentences, domain=None,
+                        distribution=None, summary=None, variant=None, seed=None,
+                        sampled=False):
+    """Yields a results row (see RESULT_COLUMNS) for each of `num_learners`
+    trials on each grammar. If given, `distribution` is called with a
+    grammar's language and returns the SentenceDistribution (see
+    learners/sentences.py) to draw its sentences from; by default they are
+    drawn uniformly. If given, each trial is also added to `summary`, a
+    learners.summaries.SweepSummary, under the irrelevance `variant`.
+
+    With a master `seed`, each trial draws from its own streams, keyed by
+    grammar and trial number (see colag/streams.py), and its seed is
+    recorded in the row. Otherwise trials use the global random module.
+
+    If `sampled`, learners draw their hypotheses with a
+    learners.sampling.LegalGrammarSampler instead of by rejection sampling.
+    """
     domain = domain or Colag.default()
     for grammar in grammar_ids:
-        language = tuple(domain.language[grammar])
+        sentences = tuple(domain.language[grammar])
+        if distribution is not None:
+            sentences = distribution(sentences)
         for trial_num in range(num_learners):
-            learner = Learner(domain)
+            language, trial_seed = sentences, ''
+            sampler = LegalGrammarSampler(domain) if sampled else None
+            if seed is None:
+                learner = Learner(domain, sampler=sampler)
+            else:
+                trial_seed = stream_seed(seed, grammar, trial_num)
+                learner = Learner(domain, sampler=sampler, rng=random.Random(trial_seed))
+                if isinstance(language, SentenceDistribution):
+                    language = language.with_rng(numpy_stream(seed, grammar, trial_num))
 
             start = datetime.now()
             sentences_consumed = learn_language(learner, language, iterations=num_sentences)
@@ -237,49 +398,56 @@ def run_vl_on_languages(Learner, grammar_ids, num_learners, num_sentences, domai
                           sentences_consumed,
                           learner.choose_grammar()]
             result += learner.weights
-            result += ['', runtime]
+            result += [trial_seed, runtime]
+            result += learner.converged_at
+            if summary is not None:
+                summary.add(variant, Learner.__name__, grammar, sentences_consumed,
+                            result[3], learner.converged_at)
             yield result
 
-def run_sim(name, irrel_tsv):
+RESULT_COLUMNS = ['Type of Learner',
+                  'Grammar ID',
+                  'Learner Number',
+                  'Number of Sentences',
+                  'Hypothesis',
+                  'sp',
+                  'hip',
+                  'hcp',
+                  'opt',
+                  'ns',
+                  'nt',
+                  'whm',
+                  'pi',
+                  'tm',
+                  'VtoI',
+                  'ItoC',
+                  'ah',
+                  'QInv',
+                  'Seed',
+                  'Time Stamp'] + ['{} Converged At'.format(p) for p in parameters]
+
+def run_sim(name, irrel_tsv, domain=None, grammar_ids=(611, 3856, 2253, 584),
+            num_learners=100, num_sentences=5000000, output="learner_results.csv"):
     """ Runs 100 simulations on all 3 learner types for 50,000 sentences in 4 different languages """
     COLAG_TSV = './data/COLAG_2011_ids.txt'
-    domain = Colag.from_tsvs(COLAG_TSV, irrel_tsv)
-    with open("learner_results.csv", "ab") as f:
+    domain = domain or Colag.from_tsvs(COLAG_TSV, irrel_tsv)
+    runtime_column = RESULT_COLUMNS.index('Time Stamp')
+    with open(output, "a", newline='') as f:
         writer = csv.writer(f)
-        writer.writerow([
-              'Type of Learner',
-              'Grammar ID',
-              'Learner Number',
-              'Number of Sentences',
-              'Hypothesis',
-              'sp',
-              'hip',
-              'hcp',
-              'opt',
-              'ns',
-              'nt',
-              'whm',
-              'pi',
-              'tm',
-              'VtoI',
-              'ItoC',
-              'ah',
-              'QInv',
-              '',
-              'Time Stamp'])
+        writer.writerow(RESULT_COLUMNS)
         then = datetime.now()
         learners = [RewardOnlyRelevantLearner]
         if name == 'normal':
             learners.append(RewardOnlyLearner)
         for learner in learners:
             results = run_vl_on_languages(learner,
-                                      grammar_ids=[611, 3856, 2253, 584],
-                                      num_learners=100,
-                                      num_sentences=5000000,
+                                      grammar_ids=grammar_ids,
+                                      num_learners=num_learners,
+                                      num_sentences=num_sentences,
                                       domain=domain)
             for n, result in enumerate(results):
                 result = [learner.__name__] + result
-                print(learner.__name__, n, result[-1].total_seconds())
+                print(learner.__name__, n, result[runtime_column].total_seconds())
                 writer.writerow(result)
         print((datetime.now() - then).total_seconds())
 
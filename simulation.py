@@ -1,47 +1,27 @@
 """ This code was used to generate the data used in notebooks/VL Path Tracking.ipynb """
 
-import random
+import os
 
 from colag.colag import Colag
+from learners.trajectory import Recording
 from learners.variational import RewardOnlyLearner, RewardOnlyRelevantLearner, learn_language
 
-class HistoryReporter():
-    " A mixin for a VL which will cause it to print out its weights every few steps "
-
-    __id_counter = 0
-
-    def __init__(self, *args, **kwargs):
-        self.__name = HistoryReporter.__id_counter
-        self.__counter = 0
-        HistoryReporter.__id_counter += 1
-        super().__init__(*args, **kwargs)
-
-    def consume(self, *args, **kwargs):
-        val = super().consume(*args, **kwargs)
-
-        if not self.__counter % 20 == 0:
-            self.__counter += 1
-            return val
-
-        row = [self.__name] + self.weights
-
-        print('\t'.join(map(str, row)))
-
-        self.__counter += 1
-        return val
-
-class LoudRewardOnlyLearner(HistoryReporter, RewardOnlyLearner):
+class LoudRewardOnlyLearner(Recording, RewardOnlyLearner):
     pass
 
-class LoudRewardOnlyRelevantLearner(HistoryReporter, RewardOnlyRelevantLearner):
+class LoudRewardOnlyRelevantLearner(Recording, RewardOnlyRelevantLearner):
     pass
 
-def track_path():
+def track_path(output_dir='trajectories'):
+    """ Saves the weight trajectory of each trial to output_dir/<trial>.npz;
+    load them with learners.trajectory.read_trajectories. """
     domain = Colag.default()
+    os.makedirs(output_dir, exist_ok=True)
     for trial in range(100):
         learner = LoudRewardOnlyRelevantLearner(domain)
         language = list(domain.language[611])
         learn_language(learner, language, 100000)
+        learner.trajectory.save(os.path.join(output_dir, '{}.npz'.format(trial)))
 
 if __name__ == "__main__":
     track_path()
@@ -0,0 +1,62 @@
+"""
+A small synthetic domain for the tests, built in memory so they don't need
+the CoLAG tsvs.
+
+Each sentence is generated by the grammars that have some fixed values for a
+few of the low eight parameter bits, so the domain has plenty of minimal
+pairs, proper subsets and weakly equivalent grammars (g and g + 2048 always
+generate the same sentences). The grammars in EMPTY_GRAMMARS are legal but
+generate nothing, like the grammars incremental.update_irrelevance adds.
+
+"""
+
+import random
+
+import pytest
+
+from colag.colag import Colag
+from colag.irrelevate_sentences import mark_irrelevant_params
+
+EMPTY_GRAMMARS = (4096, 4101, 4160)
+
+def synthetic_languages(seed=0, num_sentences=300):
+    """Returns (grammars, sentences): dicts of grammar id -> set of sentence
+    ids and sentence id -> set of grammar ids."""
+    rng = random.Random(seed)
+    low = [g for g in range(256) if rng.random() < 0.8]
+    grammar_ids = low + [2048 + g for g in low if rng.random() < 0.3]
+
+    def generators(mask, value):
+        return {g for g in grammar_ids if g & mask == value}
+
+    sentences = {}
+    sid = 1
+    while len(sentences) < num_sentences:
+        sid += rng.randint(1, 5)
+        mask = sum(1 << b for b in rng.sample(range(8), rng.randint(1, 4)))
+        gens = generators(mask, rng.getrandbits(8) & mask)
+        if rng.random() < 0.3:
+            mask = sum(1 << b for b in rng.sample(range(8), rng.randint(2, 4)))
+            gens |= generators(mask, rng.getrandbits(8) & mask)
+        if gens:
+            sentences[sid] = gens
+
+    grammars = {g: set() for g in grammar_ids + list(EMPTY_GRAMMARS)}
+    for s, gens in sentences.items():
+        for g in gens:
+            grammars[g].add(s)
+    return grammars, sentences
+
+def synthetic_domain(seed=0, num_sentences=300):
+    """Returns a dict-backed Colag of synthetic languages, with irrelevance
+    strings from mark_irrelevant_params."""
+    grammars, sentences = synthetic_languages(seed, num_sentences)
+    bare = Colag(grammars, sentences, {}, {})
+    sentence_irr = {s: ''.join(mark_irrelevant_params(bare, s)) for s in sentences}
+    grammar_irr = {g: [sentence_irr[s] for s in sorted(language)]
+                   for g, language in grammars.items()}
+    return Colag(grammars, sentences, grammar_irr, sentence_irr)
+
+@pytest.fixture(scope='session')
+def domain():
+    return synthetic_domain()
@@ -0,0 +1,39 @@
+import random
+
+import numpy as np
+import pytest
+
+from learners.batch import BatchSimulation
+from learners.variational import (RewardOnlyLearner, RewardOnlyRelevantLearner,
+                                  SkepticalRewardOnlyLearner, learn_language)
+
+NUM_LEARNERS = 300
+ITERATIONS = 500
+
+def assert_same_means(a, b, num_se=4):
+    """Asserts that the column means of samples `a` and `b` differ by less
+    than `num_se` standard errors of the difference."""
+    se = np.sqrt(a.var(axis=0, ddof=1) / len(a) + b.var(axis=0, ddof=1) / len(b))
+    difference = np.abs(a.mean(axis=0) - b.mean(axis=0))
+    assert np.all((difference <= num_se * se) | ((se == 0) & (difference == 0))), \
+        (difference, se)
+
+@pytest.mark.parametrize('Learner', [RewardOnlyLearner, RewardOnlyRelevantLearner,
+                                     SkepticalRewardOnlyLearner])
+def test_batch_matches_scalar_learners(domain, Learner):
+    target = sorted(domain.language)[40]
+    sim = BatchSimulation(domain, Learner, target, NUM_LEARNERS, learning_rate=0.05,
+                          rng=np.random.default_rng(1))
+    consumed = sim.run(ITERATIONS)
+
+    language = tuple(domain.language[target])
+    rng = random.Random(1)
+    scalar_consumed, scalar_weights = [], []
+    for _ in range(NUM_LEARNERS):
+        learner = Learner(domain, learning_rate=0.05, rng=rng)
+        scalar_consumed.append(learn_language(learner, language, ITERATIONS))
+        scalar_weights.append(learner.weights)
+
+    assert consumed.max() <= ITERATIONS
+    assert_same_means(consumed[:, None].astype(float), np.array(scalar_consumed, float)[:, None])
+    assert_same_means(sim.weights, np.array(scalar_weights))
@@ -0,0 +1,67 @@
+import os
+import random
+
+import numpy as np
+
+from colag.colag import Colag
+from colag.compiled import compile_domain
+
+from conftest import EMPTY_GRAMMARS
+
+def write_tsvs(domain, path):
+    """Writes `domain` (without its empty languages, which a tsv can't hold)
+    as a colag tsv, giving some pairs two structures, and its irrelevance
+    strings. Returns the dict-backed Colag from_tsvs would build from them,
+    and the two paths."""
+    rng = random.Random(0)
+    colag_tsv, irrelevance_tsv = str(path / 'colag.txt'), str(path / 'irrelevance.txt')
+    grammars, sentences, grammar_irr = {}, {}, {}
+    with open(colag_tsv, 'w') as f:
+        for g in sorted(set(domain.language) - set(EMPTY_GRAMMARS)):
+            for s in sorted(domain.language[g]):
+                for structure in range(rng.randint(1, 2)):
+                    f.write('{}\t{}\t{}\n'.format(g, s, 100 * s + structure))
+                    grammars.setdefault(g, set()).add(s)
+                    sentences.setdefault(s, set()).add(g)
+                    grammar_irr.setdefault(g, []).append(domain.sentence_irr[s])
+    with open(irrelevance_tsv, 'w') as f:
+        for s in sorted(domain.sentences):
+            f.write('{} {}\n'.format(s, domain.sentence_irr[s]))
+    expected = Colag(grammars, sentences, grammar_irr, dict(domain.sentence_irr))
+    return expected, colag_tsv, irrelevance_tsv
+
+def test_compiled_domain_matches_dicts(domain, tmp_path):
+    expected, colag_tsv, irrelevance_tsv = write_tsvs(domain, tmp_path)
+    compile_domain(colag_tsv, [irrelevance_tsv], str(tmp_path / 'compiled'))
+    compiled = Colag.from_compiled(str(tmp_path / 'compiled'), irrelevance_tsv)
+
+    assert {g: set(l) for g, l in compiled.language.items()} == expected.language
+    assert {s: set(g) for s, g in compiled.sentences.items()} == expected.sentences
+    assert dict(compiled.sentence_irr) == expected.sentence_irr
+    for g in expected.language:
+        assert sorted(compiled.grammar_irr[g]) == sorted(expected.grammar_irr[g])
+        assert compiled.find_supersets(g) == expected.find_supersets(g)
+        assert compiled.find_equivalent(g) == expected.find_equivalent(g)
+    assert np.array_equal(compiled.relevance_masks, expected.relevance_masks)
+    assert np.array_equal(compiled.trigger_matrix, expected.trigger_matrix)
+
+    rng = random.Random(1)
+    grammars, sentence_ids = sorted(expected.language), sorted(expected.sentences)
+    for _ in range(2000):
+        g, s = rng.choice(grammars), rng.choice(sentence_ids)
+        assert compiled.parses(g, s) == expected.parses(g, s) == (s in expected.language[g])
+    assert not compiled.parses(grammars[0], max(sentence_ids) + 1)
+
+def test_recompiling_replaces_files(domain, tmp_path):
+    expected, colag_tsv, irrelevance_tsv = write_tsvs(domain, tmp_path)
+    path = str(tmp_path / 'compiled')
+    compile_domain(colag_tsv, [irrelevance_tsv], path)
+    compiled = Colag.from_compiled(path, irrelevance_tsv)
+    bits = os.path.join(path, 'language_bits.npy')
+    inode = os.stat(bits).st_ino
+
+    compile_domain(colag_tsv, [irrelevance_tsv], path)
+    assert os.stat(bits).st_ino != inode
+    assert not [name for name in os.listdir(path) if '.tmp' in name]
+    g = sorted(expected.language)[0]
+    assert {s for s in expected.sentences if compiled.parses(g, s)} == expected.language[g]
@@ -0,0 +1,57 @@
+import pytest
+
+from colag.colag import Colag
+from colag.incremental import update_irrelevance
+from colag.relevance import relevance_matrix, write_irrelevance
+
+from conftest import synthetic_domain
+from test_relevance import MARKERS
+
+def changed_languages(domain):
+    """Returns (removed, added): a few grammars whose sentences all have
+    other generators, and a few grammars from outside the domain, some of
+    them neighbours of domain grammars and one with an empty language."""
+    removed = set()
+    for g in sorted(domain.language):
+        language = domain.language[g]
+        if len(removed) < 6 and language and \
+                all(len(domain.sentences[s] - removed - {g}) > 0 for s in language):
+            removed.add(g)
+    sentences = sorted(domain.sentences)
+    added = {256 + g: set(sentences[g::40]) for g in range(1, 5)}
+    added[512] = set()
+    return removed, added
+
+def apply_diff(domain, removed, added):
+    grammars = {g: set(language) for g, language in domain.language.items()
+                if g not in removed}
+    grammars.update(added)
+    sentences = {s: {g for g in generators if g not in removed}
+                 for s, generators in domain.sentences.items()}
+    for g, language in added.items():
+        for s in language:
+            sentences[s].add(g)
+    return Colag(grammars, sentences, {}, {})
+
+def read_strings(path):
+    with open(path) as f:
+        return dict(line.split() for line in f)
+
+@pytest.mark.parametrize('variant', sorted(MARKERS))
+def test_update_irrelevance_matches_full_recompute(tmp_path, variant):
+    domain = synthetic_domain()
+    path = str(tmp_path / 'irrelevance.txt')
+    with open(path, 'w') as f:
+        write_irrelevance(f, domain.generator_bits.row_ids,
+                          relevance_matrix(domain, variant=variant))
+    before = read_strings(path)
+    removed, added = changed_languages(domain)
+
+    recomputed = update_irrelevance(domain, path, removed, added, variant)
+
+    new_domain = apply_diff(domain, removed, added)
+    expected = {str(s): ''.join(MARKERS[variant](new_domain, s)) for s in new_domain.sentences}
+    assert read_strings(path) == expected
+    changed = {s for s in expected if expected[s] != before[s]}
+    assert changed
+    assert changed <= set(map(str, recomputed.tolist()))
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from colag.bitsets import BitsetMatrix
+from colag.lattice import superset_words
+
+from conftest import EMPTY_GRAMMARS
+
+def set_supersets(domain, g):
+    return {h for h in domain.language
+            if h != g and domain.language[g] <= domain.language[h]}
+
+def test_generator_columns_match_grammar_rows(domain):
+    assert np.array_equal(domain.generator_bits.column_ids, domain.language_bits.row_ids)
+    assert set(EMPTY_GRAMMARS) <= set(domain.generator_bits.column_ids.tolist())
+
+def test_superset_words_rejects_misaligned_grammars(domain):
+    generator_bits = BitsetMatrix.from_mapping(domain.sentences)
+    with pytest.raises(ValueError):
+        superset_words(domain.language_bits, generator_bits)
+
+def test_lattice_matches_sets(domain):
+    for g in domain.language:
+        supersets = set_supersets(domain, g)
+        subsets = {h for h in domain.language
+                   if h != g and domain.language[h] <= domain.language[g]}
+        assert domain.find_supersets(g) == supersets
+        assert domain.find_subsets(g) == subsets
+        assert domain.find_equivalent(g) == sorted(supersets & subsets)
+        assert domain.find_strict_supersets(g) == supersets - subsets
+
+def test_empty_languages_are_subsets_of_everything(domain):
+    for g in EMPTY_GRAMMARS:
+        assert domain.find_supersets(g) == set(domain.language) - {g}
+        assert domain.find_equivalent(g) == sorted(set(EMPTY_GRAMMARS) - {g})
+
+def test_minimal_supersets(domain):
+    for g in domain.language:
+        strict = set_supersets(domain, g) - {h for h in domain.language
+                                             if domain.language[h] == domain.language[g]}
+        minimal = {h for h in strict
+                   if not any(domain.language[k] < domain.language[h] for k in strict)}
+        assert domain.find_minimal_supersets(g) == minimal
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from learners.batch import BatchSimulation
+from learners.meanfield import ExpectedDynamics
+from learners.variational import RewardOnlyLearner
+
+LEARNING_RATE = 0.05
+MAX_SENTENCES = 4000
+
+# integrate follows the mean path, so it misses the noise that lets half the
+# learners converge sooner; simulate keeps most of it
+INTEGRATE_TOLERANCE = 0.35
+SIMULATE_TOLERANCE = 0.15
+
+@pytest.mark.parametrize('index', [40, 150])
+def test_estimates_match_batch_median(domain, index):
+    target = sorted(domain.language)[index]
+    sim = BatchSimulation(domain, RewardOnlyLearner, target, 300, learning_rate=LEARNING_RATE,
+                          rng=np.random.default_rng(1))
+    consumed = sim.run(MAX_SENTENCES)
+    assert np.all(sim.converged_at >= 0)
+    median = np.median(consumed)
+
+    dynamics = ExpectedDynamics(domain, RewardOnlyLearner, target, learning_rate=LEARNING_RATE)
+    integrated = dynamics.integrate(MAX_SENTENCES)[2]
+    rng = np.random.default_rng(2)
+    simulated = [dynamics.simulate(MAX_SENTENCES, rng=rng)[2] for _ in range(100)]
+    assert None not in simulated
+
+    assert abs(integrated / median - 1) < INTEGRATE_TOLERANCE, (integrated, median)
+    assert abs(np.median(simulated) / median - 1) < SIMULATE_TOLERANCE, (simulated, median)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from colag.irrelevate_sentences import (mark_irrelevant_params,
+                                        mark_irrelevant_params_ignore_supersets,
+                                        mark_irrelevant_params_ignore_weakly_equiv)
+from colag.relevance import format_lines, relevance_matrix, write_variants
+
+MARKERS = {'normal': mark_irrelevant_params,
+           'equiv': mark_irrelevant_params_ignore_weakly_equiv,
+           'superset': mark_irrelevant_params_ignore_supersets}
+
+def strings(chars):
+    return [row.tobytes().decode('ascii') for row in chars]
+
+@pytest.mark.parametrize('variant', sorted(MARKERS))
+def test_relevance_matrix_matches_mark_irrelevant_params(domain, variant):
+    sentence_ids = domain.generator_bits.row_ids.tolist()
+    expected = [''.join(MARKERS[variant](domain, s)) for s in sentence_ids]
+    assert strings(relevance_matrix(domain, variant=variant, block_size=64)) == expected
+
+def test_relevance_matrix_rows(domain):
+    rows = np.array([0, 5, 17, 200])
+    assert strings(relevance_matrix(domain, rows=rows)) == \
+        strings(relevance_matrix(domain)[rows])
+
+def test_variants_differ(domain):
+    normal = relevance_matrix(domain)
+    for variant in ['equiv', 'superset']:
+        assert np.any(relevance_matrix(domain, variant=variant) != normal)
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_write_variants(domain, tmp_path, processes):
+    outputs = {variant: str(tmp_path / '{}.txt'.format(variant)) for variant in MARKERS}
+    write_variants(domain, outputs, processes=processes, block_size=64)
+    sentence_ids = domain.generator_bits.row_ids
+    for variant, path in outputs.items():
+        with open(path) as f:
+            assert f.readlines() == format_lines(sentence_ids,
+                                                 relevance_matrix(domain, variant=variant))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+import numpy as np
+
+from learners.results import RESULT_DTYPE, ResultsWriter, learner_names, read_results
+
+def row(learner, trial):
+    return ([learner, 611, trial, 100, 611] + [0.5] * 13
+            + ['', timedelta(seconds=1)] + [-1] * 13)
+
+def test_learner_codes_span_chunks(tmp_path):
+    learners = ['RewardOnlyLearner', 'RewardOnlyRelevantLearner', 'RewardOnlyLearner',
+                'PunishOnlyLearner', 'RewardOnlyRelevantLearner']
+    with ResultsWriter(str(tmp_path), chunk_size=2) as writer:
+        writer.extend(row(learner, trial) for trial, learner in enumerate(learners))
+    results = read_results(str(tmp_path), columns=['learner', 'trial'])
+    assert results.dtype['learner'] == np.int8
+    assert learner_names(str(tmp_path))[results['learner']].tolist() == learners
+    assert results['trial'].tolist() == list(range(len(learners)))
+    assert RESULT_DTYPE.itemsize < 300
@@ -0,0 +1,54 @@
+import random
+from collections import Counter
+
+import numpy as np
+
+from learners.sampling import LegalGrammarSampler
+from learners.variational import RewardOnlyLearner, learn_language
+
+WEIGHTS = [0.2, 0.3, 0.25, 0.4, 0.1, 0.5, 0.6, 0.35, 0.7, 0.45, 0.55, 0.3, 0.65]
+
+def chi_squared(counts, probabilities, n):
+    expected = n * probabilities
+    return float(np.sum((counts - expected) ** 2 / expected))
+
+def test_probabilities_match_enumeration(domain):
+    sampler = LegalGrammarSampler(domain)
+    grammars = sorted(domain.language)
+    p = np.array([np.prod([w if (g >> (12 - i)) & 1 else 1 - w for i, w in enumerate(WEIGHTS)])
+                  for g in grammars])
+    assert np.allclose(sampler.probabilities(WEIGHTS), p / p.sum())
+
+def test_sampler_matches_choose_grammar(domain):
+    """Both the sampler and the rejection loop pass a chi-squared test
+    against the exact distribution (pooling the rarest grammars)."""
+    n = 20000
+    grammars = np.array(sorted(domain.language))
+    p = LegalGrammarSampler(domain).probabilities(WEIGHTS)
+    common = p * n >= 5
+    def pooled(values):
+        return np.append(values[common], values[~common].sum()) if not common.all() else values
+    probabilities = pooled(p)
+    dof = len(probabilities) - 1
+    for sampler in [None, LegalGrammarSampler(domain, tolerance=0)]:
+        learner = RewardOnlyLearner(domain, sampler=sampler, rng=random.Random(3))
+        learner.weights = WEIGHTS
+        drawn = Counter(learner.choose_grammar() for _ in range(n))
+        counts = np.array([drawn[g] for g in grammars])
+        counts = pooled(counts)
+        assert chi_squared(counts, probabilities, n) < dof + 5 * np.sqrt(2 * dof)
+
+def test_sampled_learners_are_reproducible(domain):
+    language = tuple(domain.language[sorted(domain.language)[40]])
+    results = []
+    for _ in range(2):
+        learner = RewardOnlyLearner(domain, learning_rate=0.01, rng=random.Random(5),
+                                    sampler=LegalGrammarSampler(domain))
+        results.append((learn_language(learner, language, 2000), learner.weights))
+    assert results[0] == results[1]
+
+def test_sample_many(domain):
+    sampler = LegalGrammarSampler(domain)
+    draws = sampler.sample_many(WEIGHTS, 1000, np.random.default_rng(0))
+    assert set(draws.tolist()) <= set(domain.language)
+    assert np.array_equal(draws, sampler.sample_many(WEIGHTS, 1000, np.random.default_rng(0)))
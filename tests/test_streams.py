@@ -0,0 +1,30 @@
+import random
+from datetime import timedelta
+
+import numpy as np
+
+from colag.streams import numpy_stream, python_stream, stream_seed
+from learners.results import ResultsWriter, decode_seed, read_results
+
+def test_stream_seeds_use_full_state():
+    seeds = [stream_seed(0, grammar, trial) for grammar in range(100) for trial in range(100)]
+    assert len(set(seeds)) == len(seeds)
+    assert max(seed.bit_length() for seed in seeds) > 64
+
+def test_python_stream_matches_recorded_seed():
+    seed = stream_seed(3, 611, 7)
+    assert python_stream(3, 611, 7).random() == random.Random(seed).random()
+    assert python_stream(3, 611, 7).random() != python_stream(3, 611, 8).random()
+
+def test_numpy_streams_are_reproducible():
+    assert np.array_equal(numpy_stream(3, 611).random(10), numpy_stream(3, 611).random(10))
+
+def test_results_store_keeps_seeds(tmp_path):
+    seed = stream_seed(3, 611, 7)
+    rows = [['RewardOnlyLearner', 611, trial, 100, 611] + [0.5] * 13
+            + [trial_seed, timedelta(seconds=1)] + [-1] * 13
+            for trial, trial_seed in enumerate([seed, ''])]
+    with ResultsWriter(str(tmp_path)) as writer:
+        writer.extend(rows)
+    seeds = read_results(str(tmp_path), columns=['seed'])['seed'].tolist()
+    assert [decode_seed(value) for value in seeds] == [seed, None]
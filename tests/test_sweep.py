@@ -0,0 +1,69 @@
+import csv
+import os
+
+import pytest
+
+from learners import sweep
+from learners.variational import RESULT_COLUMNS
+
+RUNTIME = RESULT_COLUMNS.index('Time Stamp')
+
+class Crash(Exception):
+    pass
+
+def without_runtimes(rows):
+    return [[str(x) for i, x in enumerate(row) if i != RUNTIME] for row in rows]
+
+@pytest.mark.parametrize('sampled', [False, True])
+def test_resumed_sweep_matches_uninterrupted(domain, tmp_path, monkeypatch, sampled):
+    domains = {'normal': domain}
+    tasks = sweep.sweep_tasks(variants=['normal'], grammars=sorted(domain.language)[40:42],
+                              num_trials=2, seed=3)
+    expected = without_runtimes(sweep.run_tasks(domains, tasks, 2000, processes=1,
+                                                sampled=sampled))
+
+    # crash part way through the third task, after it has saved its state
+    learn_language = sweep.learn_language
+    calls = []
+    def crashing(*args, **kwargs):
+        calls.append(None)
+        if len(calls) == 3:
+            checkpoint = kwargs['checkpoint']
+            def crash_after(counter):
+                checkpoint(counter)
+                if counter >= 900:
+                    raise Crash
+            kwargs['checkpoint'] = crash_after
+        return learn_language(*args, **kwargs)
+    monkeypatch.setattr(sweep, 'learn_language', crashing)
+
+    checkpoint_dir, output = str(tmp_path / 'checkpoint'), str(tmp_path / 'results.csv')
+    with pytest.raises(Crash):
+        sweep.run_sweep(domains, tasks, output, 2000, processes=1,
+                        checkpoint_dir=checkpoint_dir, checkpoint_every=300,
+                        sampled=sampled)
+    assert len(os.listdir(os.path.join(checkpoint_dir, 'state'))) == 1
+
+    counters = []
+    def recording(*args, **kwargs):
+        counters.append(kwargs['counter'])
+        return learn_language(*args, **kwargs)
+    monkeypatch.setattr(sweep, 'learn_language', recording)
+    sweep.run_sweep(domains, tasks, output, 2000, processes=1,
+                    checkpoint_dir=checkpoint_dir, checkpoint_every=300, sampled=sampled)
+    with open(output, newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    assert counters == [900] + [0] * (len(tasks) - 3)
+    assert without_runtimes(rows) == expected
+    assert os.listdir(os.path.join(checkpoint_dir, 'state')) == []
+
+def test_checkpoint_dir_belongs_to_one_sweep(domain, tmp_path):
+    domains = {'normal': domain}
+    tasks = sweep.sweep_tasks(variants=['normal'], grammars=sorted(domain.language)[40:41],
+                              num_trials=1, seed=3)
+    checkpoint_dir = str(tmp_path / 'checkpoint')
+    sweep.run_sweep(domains, tasks, str(tmp_path / 'results.csv'), 200, processes=1,
+                    checkpoint_dir=checkpoint_dir)
+    with pytest.raises(ValueError):
+        sweep.run_sweep(domains, tasks, str(tmp_path / 'results.csv'), 300, processes=1,
+                        checkpoint_dir=checkpoint_dir)
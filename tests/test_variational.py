@@ -0,0 +1,53 @@
+import csv
+import random
+
+import pytest
+
+from learners.variational import (RESULT_COLUMNS, RewardOnlyLearner,
+                                  RewardOnlyRelevantLearner, SkepticalRewardOnlyLearner,
+                                  learn_language, run_sim)
+
+def test_run_sim(domain, tmp_path):
+    output = tmp_path / 'learner_results.csv'
+    grammars = sorted(domain.language)[:2]
+    run_sim('normal', None, domain=domain, grammar_ids=grammars,
+            num_learners=2, num_sentences=200, output=str(output))
+    with open(output, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == RESULT_COLUMNS
+    assert len(rows) == 1 + 2 * 2 * 2
+    assert {row[0] for row in rows[1:]} == {'RewardOnlyRelevantLearner', 'RewardOnlyLearner'}
+    assert all(len(row) == len(RESULT_COLUMNS) for row in rows[1:])
+    assert all(int(row[3]) <= 200 for row in rows[1:])
+
+def scalar_learn_language(learner, language, iterations):
+    """The one-sentence-at-a-time loop learn_language batches."""
+    counter = 0
+    while not learner.converged():
+        learner.consume(learner.rng.choice(language))
+        if counter >= iterations:
+            break
+        counter += 1
+    return counter
+
+@pytest.mark.parametrize('Learner', [RewardOnlyLearner, RewardOnlyRelevantLearner,
+                                     SkepticalRewardOnlyLearner])
+@pytest.mark.parametrize('iterations', [5, 3000])
+def test_learn_language_matches_scalar_loop(domain, Learner, iterations):
+    language = tuple(domain.language[sorted(domain.language)[10]])
+    results = []
+    for learn in [learn_language, scalar_learn_language]:
+        learner = Learner(domain, learning_rate=0.05, rng=random.Random(7))
+        counter = learn(learner, language, iterations)
+        results.append((counter, learner.weights, learner.converged_at,
+                        learner.sentences_consumed))
+    assert results[0] == results[1]
+
+def test_learn_language_checkpoints(domain):
+    language = tuple(domain.language[sorted(domain.language)[10]])
+    learner = RewardOnlyLearner(domain, threshold=0, rng=random.Random(7))
+    counters = []
+    assert learn_language(learner, language, 1000, checkpoint=counters.append,
+                          checkpoint_every=300, block_size=128) == 1000
+    assert counters == [300, 600, 900]
+    assert learner.sentences_consumed == 1001